@@ -0,0 +1,16 @@
+from ._base import FeatureMatrix
+from .batch import BatchJob, run_batch
+from .metrics import METRICS, mask_metrics, trade_metrics, side_metrics
+from .parallel import parallel_search
+from .simulator import signals, simulate, simulate_filters, to_trades
+from .strategies import (
+    SearchSpace,
+    SearchStrategy,
+    RandomSearch,
+    CoordinateDescent,
+    EvolutionarySearch,
+    STRATEGIES,
+    matrix_objective
+)
+from .sweep import sweep_thresholds
+from .validation import kfold_splits, rolling_splits, validate, fold_summary
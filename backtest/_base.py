@@ -0,0 +1,173 @@
+from numpy import ndarray, empty, zeros, ones, flatnonzero, float64, int8, int64
+from pandas import DataFrame, concat
+
+import tester
+from .metrics import mask_metrics
+
+
+class FeatureMatrix:
+    """
+    Trades x indicators matrix built once and used to score many filter sets in one pass.
+
+    Attributes:
+        features: indicator values of the candle matched with every trade, shape (trades, columns)
+        columns: names of the indicator columns
+        pnl: `profit_or_loss` of every trade
+        is_long: `True` for long trades, `False` for short ones
+        index: positions of the matched trades in the original trade list
+    """
+
+    def __init__(self, features: ndarray, columns: list[str], pnl: ndarray, is_long: ndarray, index: ndarray):
+        self.features = features
+        self.columns = columns
+        self.pnl = pnl
+        self.is_long = is_long
+        self.index = index
+
+        self.column_index = {column: i for i, column in enumerate(columns)}
+
+    def __len__(self):
+        return len(self.pnl)
+
+    @classmethod
+    def build(cls, trades, dataset, columns):
+        """
+        Matches every trade with its candle and gathers the requested indicator values
+
+        :param trades: trades as loaded by `tester.load_trades` or read by `tester.read_trades_from_csv`
+        :param dataset: dataset with the candles the trades were made on, every trade being matched with
+            the last candle closed when it was opened, see `tester.match_candles`
+        :param columns: indicator columns to gather, columns missing in the dataset are skipped
+        :return: feature matrix of the trades that have a matching candle
+        """
+        trades = tester.as_trades(trades)
+        timeframe = dataset.timeframe or dataset.base_timeframe
+        rows = tester.match_candles(trades, dataset.content, timeframe.timedelta)
+        index = flatnonzero(rows >= 0)
+        rows = rows[index]
+
+        columns = [column for column in columns if column in dataset.content.columns]
+        features = empty((len(rows), len(columns)), dtype=float64)
+        for i, column in enumerate(columns):
+            features[:, i] = dataset.content[column].to_numpy(dtype=float64)[rows]
+
+        pnl = trades['profit_or_loss'].to_numpy(dtype=float64)[index]
+        is_long = (trades['side'] == 'LONG').to_numpy(dtype=bool)[index]
+
+        return cls(features, columns, pnl, is_long, index)
+
+    def subset(self, rows: ndarray):
+        """
+        Feature matrix of some of the trades, e.g. a train or test window
+
+        :param rows: positions of the trades in this matrix
+        """
+        return self.__class__(self.features[rows], self.columns, self.pnl[rows], self.is_long[rows], self.index[rows])
+
+    def encode(self, filter_sets) -> tuple[ndarray, ndarray, ndarray, ndarray]:
+        """
+        Converts filter sets into stacked condition arrays of shape (filter sets, conditions)
+
+        :param filter_sets: list of `{'long': [[column, operator, value], ...], 'short': [...]}`
+        :return: column indexes, signs (1 for '>', -1 for '<', 0 for padding), thresholds and
+            `True` where the condition applies to long trades
+        """
+        width = max((len(fs['long']) + len(fs['short']) for fs in filter_sets), default=0) or 1
+
+        columns = zeros((len(filter_sets), width), dtype=int64)
+        signs = zeros((len(filter_sets), width), dtype=int8)
+        thresholds = zeros((len(filter_sets), width), dtype=float64)
+        for_long = zeros((len(filter_sets), width), dtype=bool)
+
+        for i, filter_set in enumerate(filter_sets):
+            conditions = [(True, *c) for c in filter_set['long']] + [(False, *c) for c in filter_set['short']]
+
+            for k, (long, column, operator, value) in enumerate(conditions):
+                if operator not in tester.OPERATORS:
+                    raise ValueError(f"Unsupported operator: {operator}")
+
+                columns[i, k] = self.column_index[column]
+                signs[i, k] = 1 if operator == '>' else -1
+                thresholds[i, k] = value
+                for_long[i, k] = long
+
+        return columns, signs, thresholds, for_long
+
+    def masks(self, columns: ndarray, signs: ndarray, thresholds: ndarray, for_long: ndarray) -> ndarray:
+        """
+        Evaluates encoded filter sets against every trade
+
+        :return: boolean matrix of shape (filter sets, trades), `True` where the trade passes the filter set
+        """
+        mask = ones((len(columns), len(self)), dtype=bool)
+
+        for k in range(columns.shape[1]):
+            if not signs[:, k].any():
+                continue
+
+            values = self.features[:, columns[:, k]].T
+            passed = signs[:, k, None] * (values - thresholds[:, k, None]) > 0
+            applies = (signs[:, k] != 0)[:, None] & (self.is_long[None, :] == for_long[:, k, None])
+            mask &= passed | ~applies
+
+        return mask
+
+    def score(
+            self,
+            columns: ndarray,
+            signs: ndarray,
+            thresholds: ndarray,
+            for_long: ndarray,
+            chunk_size: int = 256,
+    ) -> tuple[ndarray, ndarray]:
+        """
+        Scores encoded filter sets chunk by chunk to keep the mask matrix small
+
+        :param chunk_size: number of filter sets evaluated at once
+        :return: summed `profit_or_loss` and number of passed trades for every filter set
+        """
+        pnl = empty(len(columns), dtype=float64)
+        counts = empty(len(columns), dtype=int64)
+
+        for start in range(0, len(columns), chunk_size):
+            end = start + chunk_size
+            mask = self.masks(columns[start:end], signs[start:end], thresholds[start:end], for_long[start:end])
+
+            pnl[start:end] = mask @ self.pnl
+            counts[start:end] = mask.sum(axis=1)
+
+        return pnl, counts
+
+    def evaluate(self, filter_sets, chunk_size: int = 256) -> tuple[ndarray, ndarray]:
+        """
+        Scores filter sets in the format used by `select.py`
+
+        :param filter_sets: list of `{'long': [[column, operator, value], ...], 'short': [...]}`
+        :param chunk_size: number of filter sets evaluated at once
+        :return: summed `profit_or_loss` and number of passed trades for every filter set
+        """
+        if not filter_sets:
+            return empty(0, dtype=float64), empty(0, dtype=int64)
+
+        return self.score(*self.encode(filter_sets), chunk_size=chunk_size)
+
+    def metrics(self, filter_sets, chunk_size: int = 256) -> DataFrame:
+        """
+        Computes the full trade statistics of every filter set, see `backtest.metrics.mask_metrics`.
+            The drawdowns follow the order of the trades in the matrix, which is the order of the trades file.
+
+        :param filter_sets: list of `{'long': [[column, operator, value], ...], 'short': [...]}`
+        :param chunk_size: number of filter sets evaluated at once
+        :return: DataFrame with one row of metrics per filter set
+        """
+        columns, signs, thresholds, for_long = self.encode(filter_sets)
+
+        return concat([
+            mask_metrics(self.pnl, self.masks(
+                columns[start:start + chunk_size],
+                signs[start:start + chunk_size],
+                thresholds[start:start + chunk_size],
+                for_long[start:start + chunk_size],
+            ), chunk_size=chunk_size)
+            for start in range(0, len(filter_sets), chunk_size)
+        ] or [mask_metrics(self.pnl, empty((0, len(self)), dtype=bool))], ignore_index=True)
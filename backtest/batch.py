@@ -0,0 +1,161 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from itertools import product
+
+from numpy import ndarray, full, zeros, nan, float64, int64
+from pandas import DataFrame
+
+import tester
+from ._base import FeatureMatrix
+from .strategies import FilterSet, SIDES
+from utils import TimeFrame
+
+
+@dataclass
+class BatchJob:
+    """
+    Filter sets to evaluate on the trades of one symbol and timeframe.
+
+    Attributes:
+        symbol: trading symbol, e.g. 'ETHUSDT'
+        timeframe: timeframe of the candles the trades were made on
+        trades: path of the trades CSV file
+        filter_sets: filter sets in the format used by `select.py`
+    """
+    symbol: str
+    timeframe: TimeFrame
+    trades: str
+    filter_sets: list[FilterSet] = field(default_factory=list)
+
+    @property
+    def dataset_key(self) -> tuple[str, str]:
+        return self.symbol.upper(), str(self.timeframe)
+
+    @property
+    def columns(self) -> list[str]:
+        return list(dict.fromkeys(c[0] for fs in self.filter_sets for side in SIDES for c in fs[side]))
+
+    @classmethod
+    def grid(
+            cls,
+            symbols: list[str],
+            timeframes: list[TimeFrame],
+            trades: str | dict[str, str],
+            filter_sets: list[FilterSet],
+    ) -> list['BatchJob']:
+        """
+        Creates a job for every combination of symbol and timeframe
+
+        :param symbols: trading symbols
+        :param timeframes: timeframes
+        :param trades: trades CSV file shared by every symbol, or one file per symbol
+        :param filter_sets: filter sets evaluated by every job
+        """
+        return [
+            cls(symbol, timeframe, trades if isinstance(trades, str) else trades[symbol], filter_sets)
+            for symbol, timeframe in product(symbols, timeframes)
+        ]
+
+
+def _evaluate(matrix: FeatureMatrix, filter_sets: list[FilterSet]) -> tuple[ndarray, ndarray]:
+    """
+    Scores filter sets on a feature matrix. Filter sets using columns missing in the matrix
+        are scored with NaN and zero trades.
+
+    :return: summed `profit_or_loss` and number of passed trades of every filter set
+    """
+    pnl = full(len(filter_sets), nan, dtype=float64)
+    counts = zeros(len(filter_sets), dtype=int64)
+
+    valid = [
+        i for i, filter_set in enumerate(filter_sets)
+        if all(c[0] in matrix.column_index for side in SIDES for c in filter_set[side])
+    ]
+    if valid:
+        pnl[valid], counts[valid] = matrix.evaluate([filter_sets[i] for i in valid])
+
+    return pnl, counts
+
+
+def run_batch(jobs: list[BatchJob], workers: int | None = None, load_workers: int = 4) -> DataFrame:
+    """
+    Evaluates the filter sets of many symbols, timeframes and trade lists.
+
+    Every trades file is read once, and every symbol and timeframe is loaded once with the union of
+        the indicator columns its jobs need, `load_workers` symbols at a time and the timeframes of
+        a symbol from the smallest up. Jobs sharing a dataset and
+        a trades file share one feature matrix. The matrices are then scored in a pool of `workers` processes.
+
+    :param jobs: jobs to run
+    :param workers: number of worker processes scoring the filter sets, defaults to the number of CPUs
+    :param load_workers: number of symbols loaded concurrently
+    :return: one row per job and filter set with the columns 'symbol', 'timeframe', 'trades', 'filter_set',
+        'long', 'short', 'pnl' and 'count', sorted by 'pnl' with the best first
+    """
+    workers = workers or os.cpu_count()
+
+    trades = {path: tester.load_trades(path) for path in dict.fromkeys(job.trades for job in jobs)}
+
+    requests: dict[tuple[str, str], dict] = {}
+    for job in jobs:
+        start, end = tester.get_date_range(trades[job.trades])
+        request = requests.setdefault(job.dataset_key, {
+            'symbol': job.symbol, 'timeframe': job.timeframe, 'start': start, 'end': end, 'columns': {}})
+
+        request['start'], request['end'] = min(request['start'], start), max(request['end'], end)
+        request['columns'].update(dict.fromkeys(job.columns))
+
+    # the timeframes of a symbol are loaded one after the other, the smallest first, so the higher timeframes
+    # are resampled from the base klines stored by then instead of fetching them concurrently
+    symbols: dict[str, list[tuple[str, str]]] = {}
+    for key in sorted(requests, key=lambda key: requests[key]['timeframe'].minutes):
+        symbols.setdefault(key[0], []).append(key)
+
+    def load(keys: list[tuple[str, str]]) -> list:
+        return [
+            tester.fetch_market_data(
+                requests[key]['symbol'],
+                requests[key]['timeframe'],
+                requests[key]['start'],
+                requests[key]['end'],
+                list(requests[key]['columns']),
+            )
+            for key in keys
+        ]
+
+    datasets = {}
+    with ThreadPoolExecutor(max_workers=load_workers) as pool:
+        for keys, loaded in zip(symbols.values(), pool.map(load, symbols.values())):
+            datasets.update(zip(keys, loaded))
+
+    matrices: dict[tuple[str, str, str], FeatureMatrix] = {}
+    for job in jobs:
+        key = (*job.dataset_key, job.trades)
+        if key not in matrices:
+            request = requests[job.dataset_key]
+            matrices[key] = FeatureMatrix.build(trades[job.trades], datasets[job.dataset_key], list(request['columns']))
+
+    tasks = [(matrices[(*job.dataset_key, job.trades)], job.filter_sets) for job in jobs]
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            scores = list(pool.map(_evaluate, *zip(*tasks)))
+    else:
+        scores = [_evaluate(*task) for task in tasks]
+
+    rows = []
+    for job, (pnl, counts) in zip(jobs, scores):
+        for i, filter_set in enumerate(job.filter_sets):
+            rows.append({
+                'symbol': job.symbol,
+                'timeframe': str(job.timeframe),
+                'trades': job.trades,
+                'filter_set': i,
+                'long': filter_set['long'],
+                'short': filter_set['short'],
+                'pnl': float(pnl[i]),
+                'count': int(counts[i]),
+            })
+
+    results = DataFrame(rows, columns=['symbol', 'timeframe', 'trades', 'filter_set', 'long', 'short', 'pnl', 'count'])
+    return results.sort_values('pnl', ascending=False, ignore_index=True)
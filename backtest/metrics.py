@@ -0,0 +1,110 @@
+from numpy import ndarray, asarray, empty, ones, where, maximum, minimum, sqrt, errstate, inf, nan, float64
+from pandas import DataFrame
+
+METRICS = [
+    'trades',
+    'wins',
+    'winrate',
+    'pnl',
+    'max_up',
+    'worst',
+    'max_drawdown',
+    'profit_factor',
+    'sharpe',
+    'sortino',
+    'expectancy',
+]
+
+
+def mask_metrics(pnl: ndarray, masks: ndarray, chunk_size: int = 256) -> DataFrame:
+    """
+    Computes the trade statistics of many subsets of the same trades at once.
+
+    Trades outside a subset leave its equity curve flat, so the drawdown of every subset is measured
+        on its own equity curve as long as `pnl` is in chronological order.
+
+    Metrics:
+        trades: number of trades
+        wins: number of trades with a positive PnL
+        winrate: share of winning trades, from 0 to 1
+        pnl: summed PnL
+        max_up: best trade
+        worst: worst trade
+        max_drawdown: largest drop of the cumulative PnL from its running peak, starting from zero
+        profit_factor: gross profit over gross loss
+        sharpe: mean over standard deviation of the trade PnL
+        sortino: mean over downside deviation of the trade PnL
+        expectancy: average PnL per trade
+
+    :param pnl: `profit_or_loss` of every trade, shape (trades,)
+    :param masks: boolean matrix of shape (subsets, trades), `True` where the trade belongs to the subset
+    :param chunk_size: number of subsets computed at once
+    :return: DataFrame with one row per subset and the `METRICS` columns, NaN where a metric is undefined
+    """
+    pnl = asarray(pnl, dtype=float64)
+    masks = asarray(masks, dtype=bool)
+    if masks.ndim == 1:
+        masks = masks[None, :]
+    results = {metric: empty(len(masks), dtype=float64) for metric in METRICS}
+
+    for start in range(0, len(masks), chunk_size):
+        end = start + chunk_size
+        mask = masks[start:end]
+        values = where(mask, pnl, 0.)
+
+        trades = mask.sum(axis=1)
+        wins = (values > 0).sum(axis=1)
+        total = values.sum(axis=1)
+        gross_profit = maximum(values, 0).sum(axis=1)
+        gross_loss = -minimum(values, 0).sum(axis=1)
+
+        equity = values.cumsum(axis=1)
+        peak = maximum.accumulate(maximum(equity, 0), axis=1)
+
+        with errstate(divide='ignore', invalid='ignore'):
+            mean = total / trades
+            std = sqrt(((values - mean[:, None]) ** 2 * mask).sum(axis=1) / (trades - 1))
+            downside = sqrt((minimum(values, 0) ** 2).sum(axis=1) / trades)
+
+            results['winrate'][start:end] = wins / trades
+            results['profit_factor'][start:end] = where(
+                gross_loss > 0, gross_profit / gross_loss, where(gross_profit > 0, inf, nan))
+            results['sharpe'][start:end] = where(std > 0, mean / std, nan)
+            results['sortino'][start:end] = where(downside > 0, mean / downside, where(mean > 0, inf, nan))
+
+        results['trades'][start:end] = trades
+        results['wins'][start:end] = wins
+        results['pnl'][start:end] = total
+        results['max_up'][start:end] = where(trades > 0, where(mask, pnl, -inf).max(axis=1, initial=-inf), nan)
+        results['worst'][start:end] = where(trades > 0, where(mask, pnl, inf).min(axis=1, initial=inf), nan)
+        results['max_drawdown'][start:end] = (peak - equity).max(axis=1, initial=0)
+        results['expectancy'][start:end] = mean
+
+    results = DataFrame(results, columns=METRICS)
+    return results.astype({'trades': 'int64', 'wins': 'int64'})
+
+
+def trade_metrics(pnl: ndarray) -> dict[str, float]:
+    """
+    Computes the `METRICS` of a single list of trades, see `mask_metrics`
+
+    :param pnl: `profit_or_loss` of every trade, in chronological order
+    :return: dictionary of metric values
+    """
+    return mask_metrics(pnl, [True] * len(pnl)).iloc[0].to_dict()
+
+
+def side_metrics(trades: DataFrame) -> DataFrame:
+    """
+    Computes the `METRICS` of all, long and short trades
+
+    :param trades: typed trades as loaded by `tester.load_trades`
+    :return: DataFrame indexed by 'total', 'long' and 'short'
+    """
+    trades = trades.sort_values('closed_at', kind='stable')
+    is_long = (trades['side'] == 'LONG').to_numpy()
+    is_short = (trades['side'] == 'SHORT').to_numpy()
+
+    results = mask_metrics(trades['profit_or_loss'].to_numpy(), [ones(len(trades), dtype=bool), is_long, is_short])
+    results.index = ['total', 'long', 'short']
+    return results
@@ -0,0 +1,115 @@
+import heapq
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from multiprocessing.util import Finalize
+from itertools import islice, count
+from typing import Iterable
+
+from numpy import ndarray, flatnonzero, argpartition
+
+from ._base import FeatureMatrix
+from utils import SharedArrays
+
+_shared: SharedArrays | None = None
+_matrix: FeatureMatrix | None = None
+
+
+def _init_worker(spec: dict, columns: list[str]):
+    """
+    Attaches the worker process to the shared feature matrix, detaching it when the worker exits
+    """
+    global _shared, _matrix
+
+    _shared = SharedArrays.attach(spec)
+    _matrix = FeatureMatrix(_shared['features'], columns, _shared['pnl'], _shared['is_long'], _shared['index'])
+    Finalize(None, _close_worker, exitpriority=0)
+
+
+def _close_worker():
+    global _shared, _matrix
+
+    # the views of the matrix are released first, the blocks cannot be closed while they are in use
+    _matrix = None
+    _shared.close()
+
+
+def _score_chunk(encoded: tuple[ndarray, ...], top_k: int, batch_size: int) -> tuple[ndarray, ndarray, ndarray]:
+    """
+    Scores a chunk of encoded filter sets and keeps only its best `top_k` non-empty ones
+
+    :return: positions in the chunk, summed PnL and number of passed trades
+    """
+    pnl, counts = _matrix.score(*encoded, chunk_size=batch_size)
+
+    keep = flatnonzero(counts > 0)
+    if len(keep) > top_k:
+        keep = keep[argpartition(-pnl[keep], top_k - 1)[:top_k]]
+
+    return keep, pnl[keep], counts[keep]
+
+
+def parallel_search(
+        matrix: FeatureMatrix,
+        candidates: Iterable[dict],
+        top_k: int = 10,
+        workers: int | None = None,
+        chunk_size: int = 10_000,
+        batch_size: int = 256,
+) -> list[dict]:
+    """
+    Scores filter sets in a process pool over a feature matrix placed in shared memory
+
+    :param matrix: feature matrix of the trades
+    :param candidates: filter sets in the format used by `select.py`, consumed lazily chunk by chunk
+    :param top_k: number of best filter sets to keep
+    :param workers: number of worker processes, defaults to the number of CPUs
+    :param chunk_size: number of filter sets sent to a worker at once
+    :param batch_size: number of filter sets a worker evaluates in one mask matrix
+    :return: best non-empty filter sets with their summed `profit_or_loss` under 'res', best first
+    """
+    workers = workers or os.cpu_count()
+
+    heap: list[tuple[float, int, dict]] = []
+    order = count()
+    candidates = iter(candidates)
+
+    with SharedArrays.create(
+            features=matrix.features,
+            pnl=matrix.pnl,
+            is_long=matrix.is_long,
+            index=matrix.index,
+    ) as shared, ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(shared.spec, matrix.columns),
+    ) as pool:
+        pending = {}
+
+        def submit() -> bool:
+            chunk = list(islice(candidates, chunk_size))
+            if not chunk:
+                return False
+
+            pending[pool.submit(_score_chunk, matrix.encode(chunk), top_k, batch_size)] = chunk
+            return True
+
+        for _ in range(workers * 2):
+            if not submit():
+                break
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                chunk = pending.pop(future)
+
+                for position, res in zip(*future.result()[:2]):
+                    item = (float(res), next(order), chunk[position])
+                    if len(heap) < top_k:
+                        heapq.heappush(heap, item)
+                    elif item[0] > heap[0][0]:
+                        heapq.heapreplace(heap, item)
+
+                submit()
+
+    return [{**filter_set, 'res': res} for res, _, filter_set in sorted(heap, key=lambda item: -item[0])]
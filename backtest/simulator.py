@@ -0,0 +1,210 @@
+from numpy import (
+    ndarray, arange, asarray, broadcast_to, concatenate, empty, flatnonzero, full, ones, zeros, where,
+    maximum, minimum, float64, int64, int8,
+)
+from pandas import DataFrame, Categorical
+
+import tester
+from utils import Trade, Side, ClosedBy, TimeFrame
+
+CLOSED_BY = [ClosedBy.TP.value, ClosedBy.SL.value, ClosedBy.URGENTLY.value]
+TP, SL, URGENTLY = range(3)
+
+
+def signals(content: DataFrame, long_filters=(), short_filters=()) -> tuple[ndarray, ndarray]:
+    """
+    Finds the candles on which the filters signal an entry. A side without filters never signals.
+
+    :param content: candles with indicator columns
+    :param long_filters: `(column, operator, value)` conditions of the long entries
+    :param short_filters: `(column, operator, value)` conditions of the short entries
+    :return: positions of the signal candles and `True` where the signal is a long one, sorted by position
+    """
+    rows = arange(len(content))
+
+    longs = flatnonzero(tester.conditions_mask(content, rows, long_filters)) if long_filters else rows[:0]
+    shorts = flatnonzero(tester.conditions_mask(content, rows, short_filters)) if short_filters else rows[:0]
+
+    positions = concatenate([longs, shorts])
+    is_long = concatenate([ones(len(longs), dtype=bool), zeros(len(shorts), dtype=bool)])
+
+    order = positions.argsort(kind='stable')
+    return positions[order], is_long[order]
+
+
+def simulate(
+        content: DataFrame,
+        entries: ndarray,
+        is_long: ndarray,
+        take_profit: float | ndarray,
+        stop_loss: float | ndarray,
+        volume: float | ndarray = 1,
+        fee: float = 0,
+        max_bars: int | None = None,
+        block_size: int = 64,
+) -> DataFrame:
+    """
+    Simulates market entries on the open of the candle following every signal, each trade being closed
+        by the first candle reaching its take profit or stop loss.
+
+    The first hit is searched for all open trades at once, over blocks of candles whose size doubles every
+        round, so the number of Python iterations grows with the logarithm of the trade duration.
+        When a candle reaches both levels, the stop loss is assumed to be hit first. A candle opening beyond
+        a level fills at its open. Trades reaching `max_bars` or the end of the data are closed urgently
+        on the close of their last candle.
+
+    :param content: candles with 'time', 'open', 'high', 'low' and 'close' columns
+    :param entries: positions of the signal candles
+    :param is_long: `True` for long entries, `False` for short ones
+    :param take_profit: distance of the take profit from the entry price, relative to it, e.g. .01 for 1%
+    :param stop_loss: distance of the stop loss from the entry price, relative to it
+    :param volume: traded volume in base asset units
+    :param fee: fee rate paid on the notional of both the entry and the exit
+    :param max_bars: maximum number of candles a trade is held, at least 1, unlimited by default
+    :param block_size: number of candles searched in the first round
+    :return: one row per simulated trade with the columns 'opened_at', 'closed_at', 'side', 'profit_or_loss',
+        'entry_price', 'exit_price', 'tp_price', 'sl_price', 'volume', 'fees_paid', 'closed_by', 'signal',
+        'entry_bar' and 'exit_bar'; compatible with the typed trades of `tester.load_trades`
+    """
+    if max_bars is not None and max_bars < 1:
+        raise ValueError(f"max_bars must be at least 1, got {max_bars}")
+
+    time = content['time'].to_numpy()
+    open_ = content['open'].to_numpy(dtype=float64)
+    high = content['high'].to_numpy(dtype=float64)
+    low = content['low'].to_numpy(dtype=float64)
+    close = content['close'].to_numpy(dtype=float64)
+    n = len(content)
+
+    entries = asarray(entries, dtype=int64)
+    count = len(entries)
+    is_long = broadcast_to(asarray(is_long, dtype=bool), (count,))
+    take_profit = broadcast_to(asarray(take_profit, dtype=float64), (count,))
+    stop_loss = broadcast_to(asarray(stop_loss, dtype=float64), (count,))
+    volume = broadcast_to(asarray(volume, dtype=float64), (count,))
+
+    keep = entries + 1 < n
+    entries, is_long, take_profit, stop_loss, volume = (
+        entries[keep], is_long[keep], take_profit[keep], stop_loss[keep], volume[keep])
+
+    entry_bar = entries + 1
+    entry_price = open_[entry_bar]
+    direction = where(is_long, 1., -1.)
+    tp_price = entry_price * (1 + direction * take_profit)
+    sl_price = entry_price * (1 - direction * stop_loss)
+    last_bar = full(len(entries), n - 1) if max_bars is None else minimum(entry_bar + max_bars - 1, n - 1)
+
+    exit_bar = empty(len(entries), dtype=int64)
+    exit_price = empty(len(entries), dtype=float64)
+    closed_by = empty(len(entries), dtype=int8)
+
+    active = arange(len(entries))
+    offset = 0
+
+    while len(active):
+        bars = entry_bar[active, None] + offset + arange(block_size)
+        in_range = bars <= last_bar[active, None]
+        bars = minimum(bars, n - 1)
+
+        long = is_long[active, None]
+        tp = tp_price[active, None]
+        sl = sl_price[active, None]
+
+        hit_tp = where(long, high[bars] >= tp, low[bars] <= tp) & in_range
+        hit_sl = where(long, low[bars] <= sl, high[bars] >= sl) & in_range
+
+        hit = hit_tp | hit_sl
+        resolved = hit.any(axis=1)
+        first = hit.argmax(axis=1)
+
+        # trades hitting a level in this block
+        trades = active[resolved]
+        bar = bars[resolved, first[resolved]]
+        by_sl = hit_sl[resolved, first[resolved]]
+        level = where(by_sl, sl_price[trades], tp_price[trades])
+        beyond = where(is_long[trades] == by_sl, minimum(level, open_[bar]), maximum(level, open_[bar]))
+
+        exit_bar[trades] = bar
+        exit_price[trades] = beyond
+        closed_by[trades] = where(by_sl, SL, TP)
+
+        # trades running out of candles in this block
+        expired = ~resolved & ~in_range[:, -1]
+        trades = active[expired]
+
+        exit_bar[trades] = last_bar[trades]
+        exit_price[trades] = close[last_bar[trades]]
+        closed_by[trades] = URGENTLY
+
+        active = active[~resolved & ~expired]
+        offset += block_size
+        block_size *= 2
+
+    fees = fee * volume * (entry_price + exit_price)
+    pnl = direction * (exit_price - entry_price) * volume - fees
+
+    return DataFrame({
+        'opened_at': time[entry_bar],
+        'closed_at': time[exit_bar],
+        'side': Categorical.from_codes(where(is_long, 0, 1), categories=[side.value for side in Side]),
+        'profit_or_loss': pnl,
+        'entry_price': entry_price,
+        'exit_price': exit_price,
+        'tp_price': tp_price,
+        'sl_price': sl_price,
+        'volume': volume,
+        'fees_paid': fees,
+        'closed_by': Categorical.from_codes(closed_by, categories=CLOSED_BY),
+        'signal': entries,
+        'entry_bar': entry_bar,
+        'exit_bar': exit_bar,
+    })
+
+
+def simulate_filters(
+        dataset,
+        long_filters=(),
+        short_filters=(),
+        **kwargs
+) -> DataFrame:
+    """
+    Simulates the trades signalled by filters on a dataset, see `signals` and `simulate`
+
+    :param dataset: dataset with the candles and their indicator columns
+    :param long_filters: `(column, operator, value)` conditions of the long entries
+    :param short_filters: `(column, operator, value)` conditions of the short entries
+    :param kwargs: parameters of `simulate`, at least `take_profit` and `stop_loss`
+    :return: simulated trades
+    """
+    entries, is_long = signals(dataset.content, long_filters, short_filters)
+    return simulate(dataset.content, entries, is_long, **kwargs)
+
+
+def to_trades(simulated: DataFrame, symbol: str, timeframe: TimeFrame) -> list[Trade]:
+    """
+    Converts simulated trades into closed `Trade` objects, e.g. to store them with `TradeDB`
+
+    :param simulated: trades returned by `simulate`
+    :param symbol: trading symbol of the candles
+    :param timeframe: timeframe of the candles
+    :return: list of closed trades
+    """
+    trades = []
+
+    for row in simulated.itertuples(index=False):
+        trade = Trade(
+            side=Side(row.side),
+            symbol=symbol,
+            timeframe=timeframe,
+            volume=row.volume,
+            entry_price=row.entry_price,
+            tp_price=row.tp_price,
+            sl_price=row.sl_price,
+            fees_paid=row.fees_paid,
+            profit_or_loss=row.profit_or_loss,
+            opened_at=row.opened_at.to_pydatetime(),
+        )
+        trade.close(by=ClosedBy(row.closed_by), at=row.closed_at.to_pydatetime())
+        trades.append(trade)
+
+    return trades
@@ -0,0 +1,393 @@
+import heapq
+from itertools import count
+from math import inf
+from random import Random
+from typing import Callable
+
+from numpy import ndarray, linspace, nanquantile, unique, searchsorted, isfinite
+
+from ._base import FeatureMatrix
+
+FilterSet = dict[str, list[list[str | float]]]
+Objective = Callable[[list[FilterSet]], ndarray]
+
+SIDES = ('long', 'short')
+SIGNS = ('<', '>')
+
+
+def filter_set_key(filter_set: FilterSet) -> tuple:
+    """
+    Hashable representation of a filter set which does not depend on the order of its conditions
+    """
+    return tuple(tuple(sorted(map(tuple, filter_set[side]))) for side in SIDES)
+
+
+def matrix_objective(matrix: FeatureMatrix, min_trades: int = 1) -> Objective:
+    """
+    Builds an objective which scores filter sets by their summed `profit_or_loss`
+
+    :param matrix: feature matrix of the trades
+    :param min_trades: filter sets passing fewer trades are scored with `-inf`
+    :return: callable taking a list of filter sets and returning their scores
+    """
+
+    def objective(filter_sets: list[FilterSet]) -> ndarray:
+        pnl, counts = matrix.evaluate(filter_sets)
+        pnl[counts < min_trades] = -inf
+        return pnl
+
+    return objective
+
+
+class SearchSpace:
+    """
+    Filter columns together with the thresholds allowed for each of them.
+
+    Attributes:
+        grids: sorted candidate thresholds for every column
+        max_conditions: maximum number of conditions in a sampled filter set
+    """
+
+    def __init__(self, grids: dict[str, ndarray], max_conditions: int = 4):
+        self.grids = grids
+        self.columns = list(grids)
+        self.max_conditions = max_conditions
+
+    @classmethod
+    def from_ranges(cls, ranges: dict[str, list[float]], points: int = 101, **kwargs):
+        """
+        Creates a space with evenly spaced thresholds, e.g. from the ranges of `filters.json`
+        """
+        return cls({column: linspace(low, high, points) for column, (low, high) in ranges.items()}, **kwargs)
+
+    @classmethod
+    def from_matrix(cls, matrix: FeatureMatrix, columns=None, points: int = 101, **kwargs):
+        """
+        Creates a space with thresholds placed on the quantiles of the values the trades actually have,
+            so that sampled filters never land in regions without trades
+
+        :param matrix: feature matrix of the trades
+        :param columns: columns to include, defaults to every column of the matrix
+        :param points: number of quantiles per column
+        """
+        grids = {}
+
+        for column in columns or matrix.columns:
+            if column not in matrix.column_index:
+                continue
+
+            values = matrix.features[:, matrix.column_index[column]]
+            values = values[isfinite(values)]
+            if len(unique(values)) < 2:
+                continue
+
+            grids[column] = unique(nanquantile(values, linspace(0, 1, points)))
+
+        return cls(grids, **kwargs)
+
+    def threshold(self, column: str, rng: Random) -> float:
+        grid = self.grids[column]
+        return float(grid[rng.randrange(len(grid))])
+
+    def nudge(self, column: str, value: float, rng: Random, scale: float = 3) -> float:
+        """
+        Moves a threshold by a few grid steps
+        """
+        grid = self.grids[column]
+        position = int(searchsorted(grid, value)) + round(rng.gauss(0, scale))
+        return float(grid[min(max(position, 0), len(grid) - 1)])
+
+    def sample(self, rng: Random) -> FilterSet:
+        """
+        Draws a random filter set with one to `max_conditions` conditions on distinct base filters
+        """
+        filter_set = {'long': [], 'short': []}
+        used_filters = set()
+
+        for column in rng.sample(self.columns, min(rng.randint(1, self.max_conditions), len(self.columns))):
+            base_filt = column.split('_')[0]
+            if base_filt in used_filters:
+                continue
+
+            filter_set[rng.choice(SIDES)].append([column, rng.choice(SIGNS), self.threshold(column, rng)])
+            used_filters.add(base_filt)
+
+        return filter_set
+
+    def mutate(self, filter_set: FilterSet, rng: Random, rate: float = .3) -> FilterSet:
+        """
+        Nudges thresholds, flips signs, and adds or drops conditions
+        """
+        child = {side: [] for side in SIDES}
+
+        for side in SIDES:
+            for column, sign, value in filter_set[side]:
+                if rng.random() < rate:
+                    value = self.nudge(column, value, rng)
+                if rng.random() < rate / 3:
+                    sign = '>' if sign == '<' else '<'
+                if rng.random() < rate / 3:
+                    continue
+                child[side].append([column, sign, value])
+
+        size = sum(len(child[side]) for side in SIDES)
+        if size == 0 or (size < self.max_conditions and rng.random() < rate):
+            column = rng.choice(self.columns)
+            if all(column != condition[0] for side in SIDES for condition in child[side]):
+                child[rng.choice(SIDES)].append([column, rng.choice(SIGNS), self.threshold(column, rng)])
+
+        return child
+
+    @staticmethod
+    def crossover(first: FilterSet, second: FilterSet, rng: Random) -> FilterSet:
+        """
+        Takes every condition of the two parents with even chances, at most one per column and side
+        """
+        child = {side: [] for side in SIDES}
+
+        for side in SIDES:
+            conditions = {}
+            for column, sign, value in first[side] + second[side]:
+                if rng.random() < .5:
+                    conditions[column] = [column, sign, value]
+            child[side] = list(conditions.values())
+
+        if not any(child.values()):
+            child = {side: [list(condition) for condition in first[side]] for side in SIDES}
+
+        return child
+
+
+class SearchStrategy:
+    """
+    Base class of the filter search strategies.
+
+    Subclasses implement `_run`, evaluating candidates with `_evaluate` until `done` becomes `True`.
+
+    :param space: search space to draw filter sets from
+    :param budget: maximum number of evaluated filter sets
+    :param patience: stop after this many evaluations without improving the best score
+    :param batch_size: number of filter sets evaluated at once
+    :param top_k: number of best filter sets to return
+    :param seed: seed of the random generator
+    """
+
+    def __init__(
+            self,
+            space: SearchSpace,
+            budget: int = 10_000,
+            patience: int | None = None,
+            batch_size: int = 256,
+            top_k: int = 10,
+            seed: int | None = None,
+    ):
+        if batch_size <= 0:
+            raise ValueError(f"batch_size must be positive, got {batch_size}")
+
+        self.space = space
+        self.budget = budget
+        self.patience = patience
+        self.batch_size = batch_size
+        self.top_k = top_k
+        self.rng = Random(seed)
+
+        self.evaluations = 0
+        self.best_score = -inf
+        self._last_improvement = 0
+        self._heap: list[tuple[float, int, FilterSet]] = []
+        self._kept: set[tuple] = set()
+        self._order = count()
+
+    @property
+    def done(self) -> bool:
+        if self.evaluations >= self.budget:
+            return True
+        return self.patience is not None and self.evaluations - self._last_improvement >= self.patience
+
+    def search(self, objective: Objective) -> list[FilterSet]:
+        """
+        Runs the strategy until the budget is spent or the search stops improving
+
+        :param objective: callable taking a list of filter sets and returning their scores
+        :return: best filter sets with their scores under 'res', best first
+        """
+        self.evaluations = 0
+        self.best_score = -inf
+        self._last_improvement = 0
+        self._heap = []
+        self._kept = set()
+
+        if self.space.columns:
+            self._run(objective)
+
+        return [{**filter_set, 'res': score} for score, _, filter_set in sorted(self._heap, key=lambda i: -i[0])]
+
+    def _run(self, objective: Objective):
+        raise NotImplementedError
+
+    def _evaluate(self, objective: Objective, candidates: list[FilterSet]) -> list[float]:
+        """
+        Scores candidates within the remaining budget and records the best of them
+
+        :return: scores of the evaluated candidates, may be shorter than `candidates`
+        """
+        candidates = candidates[:max(self.budget - self.evaluations, 0)]
+        if not candidates:
+            return []
+
+        scores = [float(score) for score in objective(candidates)]
+
+        for filter_set, score in zip(candidates, scores):
+            self.evaluations += 1
+            if score == -inf:
+                continue
+
+            if score > self.best_score:
+                self.best_score = score
+                self._last_improvement = self.evaluations
+
+            key = filter_set_key(filter_set)
+            if key in self._kept:
+                continue
+
+            item = (score, next(self._order), filter_set)
+            if len(self._heap) < self.top_k:
+                heapq.heappush(self._heap, item)
+            elif score > self._heap[0][0]:
+                _, _, dropped = heapq.heapreplace(self._heap, item)
+                self._kept.discard(filter_set_key(dropped))
+            else:
+                continue
+
+            self._kept.add(key)
+
+        return scores
+
+
+class RandomSearch(SearchStrategy):
+    """
+    Samples filter sets independently from the search space
+    """
+
+    def _run(self, objective: Objective):
+        while not self.done:
+            if not self._evaluate(objective, [self.space.sample(self.rng) for _ in range(self.batch_size)]):
+                break
+
+
+class CoordinateDescent(SearchStrategy):
+    """
+    Greedy search which optimizes one column at a time, trying to drop its condition or to set it to
+        every side, sign and threshold of a coarse grid. Restarts from a random filter set once a full
+        pass over the columns brings no improvement.
+
+    :param steps: number of thresholds tried per column
+    """
+
+    def __init__(self, space: SearchSpace, steps: int = 16, **kwargs):
+        super().__init__(space, **kwargs)
+        self.steps = steps
+
+    def variants(self, filter_set: FilterSet, column: str) -> list[FilterSet]:
+        base = {side: [c for c in filter_set[side] if c[0] != column] for side in SIDES}
+        grid = self.space.grids[column]
+        thresholds = grid[linspace(0, len(grid) - 1, min(self.steps, len(grid))).round().astype(int)]
+
+        variants = [base]
+        for side in SIDES:
+            for sign in SIGNS:
+                for value in thresholds:
+                    variant = {s: list(base[s]) for s in SIDES}
+                    variant[side].append([column, sign, float(value)])
+                    variants.append(variant)
+
+        return variants
+
+    def _run(self, objective: Objective):
+        while not self.done:
+            candidates = [self.space.sample(self.rng) for _ in range(self.batch_size)]
+            scores = self._evaluate(objective, candidates)
+            if not scores:
+                break
+
+            score = max(scores)
+            current = candidates[scores.index(score)]
+
+            improved = True
+            while improved and not self.done:
+                improved = False
+
+                columns = list(self.space.columns)
+                self.rng.shuffle(columns)
+
+                for column in columns:
+                    variants = self.variants(current, column)
+                    scores = self._evaluate(objective, variants)
+
+                    if scores and max(scores) > score:
+                        score = max(scores)
+                        current = variants[scores.index(score)]
+                        improved = True
+
+                    if self.done:
+                        break
+
+
+class EvolutionarySearch(SearchStrategy):
+    """
+    Genetic search keeping the best filter sets of every generation and breeding the rest
+        by tournament selection, crossover and mutation
+
+    :param population: number of filter sets per generation
+    :param elite: number of best filter sets carried over unchanged
+    :param mutation_rate: probability of mutating each condition
+    :param tournament: number of filter sets competing for every parent slot
+    """
+
+    def __init__(
+            self,
+            space: SearchSpace,
+            population: int = 128,
+            elite: int = 8,
+            mutation_rate: float = .3,
+            tournament: int = 3,
+            **kwargs
+    ):
+        if not population > elite >= 0:
+            raise ValueError(f"Expected population > elite >= 0, got population={population} and elite={elite}")
+
+        super().__init__(space, **kwargs)
+        self.population = population
+        self.elite = elite
+        self.mutation_rate = mutation_rate
+        self.tournament = tournament
+
+    def _select(self, ranked: list[tuple[float, FilterSet]]) -> FilterSet:
+        return max(self.rng.sample(ranked, min(self.tournament, len(ranked))), key=lambda item: item[0])[1]
+
+    def _run(self, objective: Objective):
+        population = [self.space.sample(self.rng) for _ in range(self.population)]
+        scores = self._evaluate(objective, population)
+        ranked = sorted(zip(scores, population), key=lambda item: -item[0])
+
+        while not self.done and ranked:
+            children = [
+                self.space.mutate(
+                    self.space.crossover(self._select(ranked), self._select(ranked), self.rng),
+                    self.rng,
+                    self.mutation_rate,
+                )
+                for _ in range(self.population - self.elite)
+            ]
+            scores = self._evaluate(objective, children)
+            if not scores:
+                break
+
+            ranked = sorted(ranked[:self.elite] + list(zip(scores, children)), key=lambda item: -item[0])
+
+
+STRATEGIES: dict[str, type[SearchStrategy]] = {
+    'random': RandomSearch,
+    'greedy': CoordinateDescent,
+    'evolutionary': EvolutionarySearch,
+}
@@ -0,0 +1,85 @@
+from numpy import ndarray, argsort, cumsum, concatenate, zeros, unique, searchsorted, isnan, full
+from pandas import DataFrame, concat
+
+from ._base import FeatureMatrix
+
+
+def _side_curve(values: ndarray, pnl: ndarray) -> DataFrame:
+    """
+    PnL of every '<' and '>' threshold over one side's trades, using prefix sums over the trades sorted
+        by indicator value. Trades with a missing value fail both operators.
+
+    :param values: indicator value of every trade
+    :param pnl: `profit_or_loss` of every trade
+    :return: curve with 'operator', 'threshold', 'trades', 'wins' and 'pnl' columns
+    """
+    known = ~isnan(values)
+    values, pnl = values[known], pnl[known]
+
+    order = argsort(values, kind='stable')
+    values, pnl = values[order], pnl[order]
+
+    cum_pnl = concatenate((zeros(1), cumsum(pnl)))
+    cum_wins = concatenate((zeros(1, dtype=int), cumsum(pnl > 0)))
+
+    thresholds = unique(values)
+    below = searchsorted(values, thresholds, side='left')
+    above = searchsorted(values, thresholds, side='right')
+
+    return concat([
+        DataFrame({
+            'operator': full(len(thresholds), '<'),
+            'threshold': thresholds,
+            'trades': below,
+            'wins': cum_wins[below],
+            'pnl': cum_pnl[below],
+        }),
+        DataFrame({
+            'operator': full(len(thresholds), '>'),
+            'threshold': thresholds,
+            'trades': len(values) - above,
+            'wins': cum_wins[-1] - cum_wins[above],
+            'pnl': cum_pnl[-1] - cum_pnl[above],
+        }),
+    ], ignore_index=True)
+
+
+def sweep_thresholds(
+        matrix: FeatureMatrix,
+        columns=None,
+        min_trades: int = 1,
+) -> tuple[DataFrame, dict[str, DataFrame]]:
+    """
+    Evaluates every possible single-condition filter of every column in O(n log n) per column
+
+    :param matrix: feature matrix of the trades
+    :param columns: columns to sweep, defaults to every column of the matrix
+    :param min_trades: thresholds passing fewer trades are never the best, as in `matrix_objective`
+    :return: best threshold of every column with its side, operator, trades, wins and PnL,
+        and the full PnL-vs-threshold curve of every column
+    """
+    curves = {}
+
+    for column in columns or matrix.columns:
+        if column not in matrix.column_index:
+            continue
+
+        values = matrix.features[:, matrix.column_index[column]]
+        curve = concat([
+            _side_curve(values[side_mask], matrix.pnl[side_mask]).assign(side=side)
+            for side, side_mask in (('long', matrix.is_long), ('short', ~matrix.is_long))
+        ], ignore_index=True)
+
+        curves[column] = curve[['side', 'operator', 'threshold', 'trades', 'wins', 'pnl']]
+
+    eligible = {column: curve[curve['trades'] >= min_trades] for column, curve in curves.items()}
+    eligible = {column: curve for column, curve in eligible.items() if not curve.empty}
+
+    best = DataFrame(
+        [curve.loc[curve['pnl'].idxmax()] for curve in eligible.values()],
+        columns=['side', 'operator', 'threshold', 'trades', 'wins', 'pnl'],
+    )
+    best.insert(0, 'column', list(eligible))
+    best = best.sort_values('pnl', ascending=False, ignore_index=True)
+
+    return best, curves
@@ -0,0 +1,205 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from multiprocessing.util import Finalize
+
+from numpy import ndarray, arange, linspace, searchsorted, timedelta64, float64
+from pandas import DataFrame, Index, Series, concat
+
+import tester
+from ._base import FeatureMatrix
+from .strategies import SearchSpace, STRATEGIES, matrix_objective
+from utils import SharedArrays
+
+Split = tuple[ndarray, ndarray]
+
+_shared: SharedArrays | None = None
+_matrix: FeatureMatrix | None = None
+
+
+def kfold_splits(times: ndarray, k: int = 5, expanding: bool = False) -> list[Split]:
+    """
+    Splits trades chronologically into `k + 1` blocks of equal size, the fold `i` training on the block `i`
+        and testing on the block `i + 1`
+
+    :param times: open times of the trades, in chronological order
+    :param k: number of folds
+    :param expanding: train on every block before the test one instead of the previous block only
+    :return: train and test positions of the trades for every fold
+    """
+    bounds = linspace(0, len(times), k + 2).astype(int)
+    return [
+        (arange(0 if expanding else bounds[i], bounds[i + 1]), arange(bounds[i + 1], bounds[i + 2]))
+        for i in range(k)
+    ]
+
+
+def rolling_splits(
+        times: ndarray,
+        train: timedelta,
+        test: timedelta,
+        step: timedelta | None = None,
+        expanding: bool = False,
+) -> list[Split]:
+    """
+    Splits trades into rolling train and test time windows, see `Dataset.walk_forward`
+
+    :param times: open times of the trades, in chronological order
+    :param train: length of the train windows
+    :param test: length of the test windows
+    :param step: shift between consecutive windows, `test` by default
+    :param expanding: start every train window at the first trade instead of shifting it
+    :return: train and test positions of the trades for every window with a complete test part
+    """
+    step = test if step is None else step
+    splits = []
+
+    if not len(times):
+        return splits
+
+    origin, end = times[0], times[-1]
+    train, test, step = (timedelta64(value) for value in (train, test, step))
+
+    while origin + train + test <= end:
+        start, middle, stop = searchsorted(times, [origin, origin + train, origin + train + test])
+        splits.append((arange(0 if expanding else start, middle), arange(middle, stop)))
+        origin += step
+
+    return splits
+
+
+def _init_worker(spec: dict, columns: list[str]):
+    """
+    Attaches the worker process to the shared feature matrix, detaching it when the worker exits
+    """
+    global _shared, _matrix
+
+    _shared = SharedArrays.attach(spec)
+    _matrix = FeatureMatrix(_shared['features'], columns, _shared['pnl'], _shared['is_long'], _shared['index'])
+    Finalize(None, _close_worker, exitpriority=0)
+
+
+def _close_worker():
+    global _shared, _matrix
+
+    # the views of the matrix are released first, the blocks cannot be closed while they are in use
+    _matrix = None
+    _shared.close()
+
+
+def _run_fold(
+        fold: int,
+        split: Split,
+        strategy: str,
+        min_trades: int,
+        options: dict,
+        matrix: FeatureMatrix | None = None,
+) -> DataFrame:
+    """
+    Optimizes filter sets on the train trades of a fold and scores them on its test trades
+
+    :return: one row per found filter set with its train and test metrics
+    """
+    matrix = _matrix if matrix is None else matrix
+    train, test = matrix.subset(split[0]), matrix.subset(split[1])
+
+    optimizer = STRATEGIES[strategy](SearchSpace.from_matrix(train), **options)
+    filter_sets = [
+        {'long': found['long'], 'short': found['short']}
+        for found in optimizer.search(matrix_objective(train, min_trades))
+    ]
+
+    results = DataFrame({
+        'fold': fold,
+        'rank': range(len(filter_sets)),
+        'long': [filter_set['long'] for filter_set in filter_sets],
+        'short': [filter_set['short'] for filter_set in filter_sets],
+        'train_size': len(train),
+        'test_size': len(test),
+    })
+
+    return concat((
+        results,
+        train.metrics(filter_sets).add_prefix('train_'),
+        test.metrics(filter_sets).add_prefix('test_'),
+    ), axis=1)
+
+
+def validate(
+        trades,
+        matrix: FeatureMatrix,
+        splits: list[Split] | None = None,
+        k: int = 5,
+        strategy: str = 'random',
+        min_trades: int = 1,
+        workers: int | None = None,
+        **options
+) -> DataFrame:
+    """
+    Walk-forward validation of the filter search: filter sets are optimized on the train trades of every
+        fold and scored on the test trades following them, the folds running in a pool of processes
+        over the feature matrix placed in shared memory.
+
+    :param trades: trades the matrix was built from, see `FeatureMatrix.build`
+    :param matrix: feature matrix of the trades
+    :param splits: train and test positions of the trades in chronological order, made by `rolling_splits`
+        or `kfold_splits`; `k` chronological folds by default
+    :param k: number of folds when `splits` are not given
+    :param strategy: name of the search strategy, see `STRATEGIES`
+    :param min_trades: filter sets passing fewer train trades are not selected
+    :param workers: number of worker processes, defaults to the number of CPUs
+    :param options: parameters of the strategy, e.g. `budget`, `top_k` or `seed`
+    :return: one row per fold and found filter set with 'fold', 'rank', 'long', 'short', the number of trades
+        in the windows ('train_size' and 'test_size') and the `METRICS` of the filter set prefixed
+        by 'train_' and 'test_'
+    """
+    opened_at = tester.as_trades(trades)['opened_at'].to_numpy()[matrix.index]
+    order = opened_at.argsort(kind='stable')
+    matrix = matrix.subset(order)
+
+    if splits is None:
+        splits = kfold_splits(opened_at[order], k)
+
+    workers = min(workers or os.cpu_count(), len(splits))
+    tasks = [(fold, split, strategy, min_trades, options) for fold, split in enumerate(splits)]
+
+    if workers > 1:
+        with SharedArrays.create(
+                features=matrix.features,
+                pnl=matrix.pnl,
+                is_long=matrix.is_long,
+                index=matrix.index,
+        ) as shared, ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(shared.spec, matrix.columns),
+        ) as pool:
+            results = list(pool.map(_run_fold, *zip(*tasks)))
+    else:
+        results = [_run_fold(*task, matrix=matrix) for task in tasks]
+
+    if not results:
+        return DataFrame(columns=['fold', 'rank', 'long', 'short', 'train_size', 'test_size', 'train_pnl', 'test_pnl'])
+    return concat(results, ignore_index=True)
+
+
+def fold_summary(results: DataFrame) -> DataFrame:
+    """
+    Summarizes the results of `validate` per fold
+
+    :return: mean train and test PnL of the found filter sets, the share of them profitable on the test trades
+        and the rank correlation of their train and test PnL, without rows when there are no results
+    """
+    if results.empty:
+        return DataFrame(
+            columns=['train_pnl', 'test_pnl', 'test_profitable', 'rank_correlation'],
+            index=Index([], name='fold'),
+            dtype=float64,
+        )
+
+    return results.groupby('fold')[['train_pnl', 'test_pnl']].apply(lambda fold: Series({
+        'train_pnl': fold['train_pnl'].mean(),
+        'test_pnl': fold['test_pnl'].mean(),
+        'test_profitable': (fold['test_pnl'] > 0).mean(),
+        'rank_correlation': fold['train_pnl'].rank().corr(fold['test_pnl'].rank()),
+    }))
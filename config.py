@@ -13,7 +13,19 @@ class DatabaseSettings:
     _port: str = '5432'
     _name: str = getenv('name')
 
-    CONNECTION_STRING = f"{_engine}://{_user}:{_password}@{_host}:{_port}/{_name}"
+    _url: str | None = getenv('url')
+
+    CONNECTION_STRING = _url or f"{_engine}://{_user}:{_password}@{_host}:{_port}/{_name}"
+
+    # 'sql' keeps klines in the database above, 'columnar' in local Arrow files under KLINES_PATH
+    KLINES_STORAGE: str = getenv('klines_storage', 'sql')
+    KLINES_PATH: str = getenv('klines_path', 'klines')
+
+    # Indicator columns computed on demand are cached per column under FEATURES_PATH, see `dataset.FeatureCache`
+    FEATURES_PATH: str = getenv('features_path', 'features')
+
+    # In columnar mode the database is only needed when its url is set explicitly
+    ENABLED: bool = KLINES_STORAGE == 'sql' or _url is not None
 
     class Tables(str, Enum):
         KLINES = 'Klines'
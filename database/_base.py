@@ -1,10 +1,16 @@
-from sqlalchemy import create_engine, inspect, Engine
+from datetime import datetime
+from math import isnan
+
+from sqlalchemy import create_engine, inspect, insert, select, func, Engine, Index, MetaData, Table
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import sessionmaker, Session
-from pandas import DataFrame, read_sql, concat
+from pandas import DataFrame, read_sql, isnull
 from typing import List, Callable
 
-from .models import Base, TradeDB
-from utils import Trade
+from .models import Base, TradeDB, KlinesCoverageDB, BacktestRunDB, FilterSetResultDB
+from .columnar import ColumnarStorage
+from utils import Trade, TimeFrame, merge_intervals, get_batch
 from config import DatabaseSettings
 
 
@@ -12,6 +18,13 @@ class Database:
     engine: Engine = create_engine(DatabaseSettings.CONNECTION_STRING)
     sm: Callable[[], Session] = sessionmaker(bind=engine, expire_on_commit=False)
 
+    klines_storage: ColumnarStorage | None = (
+        ColumnarStorage(DatabaseSettings.KLINES_PATH) if DatabaseSettings.KLINES_STORAGE == 'columnar' else None
+    )
+
+    # columns of the klines tables already created and indexed by this process
+    _klines_columns: dict[str, list[str]] = {}
+
     @staticmethod
     def klines_tablename(symbol: str, interval: int, unit: str):
         """
@@ -32,22 +45,29 @@ class Database:
             interval: int,
             unit: str,
     ):
+        if cls.klines_storage is not None:
+            return cls.klines_storage.add_klines(table, symbol, interval, unit)
 
         tablename = cls.klines_tablename(symbol, interval, unit)
-
-        if cls.is_table_exists(tablename):
-            df = read_sql(tablename, cls.engine)
-            table = concat([table, df], ignore_index=True)
-            table.drop_duplicates(inplace=True)
-            table.sort_values('time', inplace=True)
-            table.reset_index(drop=True, inplace=True)
+        table = table.drop_duplicates('time', keep='last').sort_values('time')
 
         try:
-            table.to_sql(
+            if tablename not in cls._klines_columns:
+                if not cls.is_table_exists(tablename):
+                    table.head(0).to_sql(name=tablename, con=cls.engine, index=False)
+                cls.create_time_index(tablename)
+
+                cls._klines_columns[tablename] = [
+                    column['name'] for column in inspect(cls.engine).get_columns(tablename)
+                ]
+
+            table.reindex(columns=cls._klines_columns[tablename]).to_sql(
                 name=tablename,
                 con=cls.engine,
-                if_exists='replace',
-                index=False
+                if_exists='append',
+                index=False,
+                chunksize=10_000,
+                method=cls._insert_missing,
             )
 
         except Exception as ex_:
@@ -57,8 +77,76 @@ class Database:
                 f"{ex_.__traceback__.__str__()}"
             )
 
+    @staticmethod
+    def _insert_missing(pd_table, conn, keys, data_iter) -> int:
+        """
+        `DataFrame.to_sql` insertion method which skips rows whose `time` is already stored
+
+        :return: number of inserted rows
+        """
+        rows = [dict(zip(keys, row)) for row in data_iter]
+        table = pd_table.table
+
+        if not rows:
+            return 0
+
+        match conn.dialect.name:
+            case 'postgresql':
+                statement = postgresql.insert(table).on_conflict_do_nothing(index_elements=['time'])
+            case 'sqlite':
+                statement = sqlite.insert(table).on_conflict_do_nothing(index_elements=['time'])
+            case _:
+                times = [row['time'] for row in rows]
+                stored = set(conn.execute(select(table.c.time).where(
+                    table.c.time.between(min(times), max(times)))).scalars())
+                rows = [row for row in rows if row['time'] not in stored]
+                statement = table.insert()
+
+        if not rows:
+            return 0
+        return conn.execute(statement, rows).rowcount
+
+    @classmethod
+    def create_time_index(cls, tablename: str):
+        """
+        Creates the unique index on `time` of a klines table. Tables written before the index existed
+            may hold repeated times, those are rewritten once without the duplicates.
+
+        :param tablename: name of the klines table
+        """
+        table = Table(tablename, MetaData(), autoload_with=cls.engine)
+        index = Index(f'ix_{tablename}_time', table.c.time, unique=True)
+
+        try:
+            index.create(cls.engine, checkfirst=True)
+        except IntegrityError:
+            df = read_sql(tablename, cls.engine).drop_duplicates('time').sort_values('time')
+            df.to_sql(name=tablename, con=cls.engine, if_exists='replace', index=False)
+            index.create(cls.engine, checkfirst=True)
+
     @classmethod
-    def get_klines(cls, symbol: str, interval: int, unit: str) -> None | DataFrame:
+    def get_klines(
+            cls,
+            symbol: str,
+            interval: int,
+            unit: str,
+            start: datetime | None = None,
+            end: datetime | None = None,
+            columns: list[str] | None = None,
+    ) -> None | DataFrame:
+        """
+        Reads stored klines, filtering by time and columns on the database side
+
+        :param symbol: trading symbol
+        :param interval: time interval of the klines
+        :param unit: time unit of the klines
+        :param start: earliest kline time to load, inclusive
+        :param end: latest kline time to load, exclusive
+        :param columns: columns to load, every column by default; 'time' is always loaded
+        :return: klines sorted by time, or `None` if the table does not exist
+        """
+        if cls.klines_storage is not None:
+            return cls.klines_storage.get_klines(symbol, interval, unit, start, end, columns)
 
         tablename = cls.klines_tablename(symbol, interval, unit)
 
@@ -66,9 +154,22 @@ class Database:
             return None
 
         try:
+            table = Table(tablename, MetaData(), autoload_with=cls.engine)
+
+            if columns is None:
+                query = select(table)
+            else:
+                query = select(table.c.time, *[table.c[c] for c in columns if c in table.c and c != 'time'])
+
+            if start is not None:
+                query = query.where(table.c.time >= start)
+            if end is not None:
+                query = query.where(table.c.time < end)
+
             return read_sql(
-                sql=tablename,
+                sql=query.order_by(table.c.time),
                 con=cls.engine,
+                parse_dates=['time'],
             )
 
         except Exception as ex_:
@@ -78,6 +179,218 @@ class Database:
                 f"{ex_.__traceback__.__str__()}"
             )
 
+    @classmethod
+    def get_klines_range(cls, symbol: str, interval: int, unit: str) -> None | tuple[datetime, datetime]:
+        """
+        Finds the first and the last stored kline time without loading the klines
+
+        :param symbol: trading symbol
+        :param interval: time interval of the klines
+        :param unit: time unit of the klines
+        :return: times of the first and the last kline, or `None` if nothing is stored
+        """
+        if cls.klines_storage is not None:
+            return cls.klines_storage.get_klines_range(symbol, interval, unit)
+
+        tablename = cls.klines_tablename(symbol, interval, unit)
+
+        if not cls.is_table_exists(tablename):
+            return None
+
+        time = Table(tablename, MetaData(), autoload_with=cls.engine).c.time
+        first, last = read_sql(
+            sql=select(func.min(time).label('first'), func.max(time).label('last')),
+            con=cls.engine,
+            parse_dates=['first', 'last'],
+        ).iloc[0]
+
+        if isnull(first):
+            return None
+        return first.to_pydatetime(), last.to_pydatetime()
+
+    @classmethod
+    def get_klines_coverage(cls, symbol: str, interval: int, unit: str) -> list[tuple[datetime, datetime]]:
+        """
+        Reads the time intervals of klines which were already fetched from the exchange
+
+        :param symbol: trading symbol
+        :param interval: time interval of the klines
+        :param unit: time unit of the klines
+        :return: sorted, disjoint `(start, end)` intervals
+        """
+        if cls.klines_storage is not None:
+            return cls.klines_storage.get_klines_coverage(symbol, interval, unit)
+
+        with cls.sm() as session:
+            rows = session.query(KlinesCoverageDB.start, KlinesCoverageDB.end).filter_by(
+                tablename=cls.klines_tablename(symbol, interval, unit)
+            ).order_by(KlinesCoverageDB.start).all()
+
+        return [(start, end) for start, end in rows]
+
+    @classmethod
+    def add_klines_coverage(cls, symbol: str, interval: int, unit: str, intervals: list[tuple[datetime, datetime]]):
+        """
+        Records time intervals of klines as fetched, merging them with the stored ones
+
+        :param symbol: trading symbol
+        :param interval: time interval of the klines
+        :param unit: time unit of the klines
+        :param intervals: fetched `(start, end)` intervals
+        """
+        if cls.klines_storage is not None:
+            return cls.klines_storage.add_klines_coverage(symbol, interval, unit, intervals)
+
+        tablename = cls.klines_tablename(symbol, interval, unit)
+        coverage = merge_intervals([*cls.get_klines_coverage(symbol, interval, unit), *intervals])
+
+        with cls.sm() as session, session.begin():
+            session.query(KlinesCoverageDB).filter_by(tablename=tablename).delete()
+            session.add_all([KlinesCoverageDB(tablename=tablename, start=start, end=end) for start, end in coverage])
+
+    @classmethod
+    def add_trades(cls, trades: List[Trade], batch_size: int = 10_000) -> int:
+        """
+        Stores trades with bulk inserts of `batch_size` rows
+
+        :param trades: trades to store, e.g. simulated by `backtest.simulate` and converted by `backtest.to_trades`
+        :param batch_size: number of rows inserted per statement
+        :return: number of stored trades
+        """
+        rows = [{**trade.as_dict, 'timeframe': str(trade.timeframe)} for trade in trades]
+
+        with cls.sm() as session, session.begin():
+            for batch in get_batch(rows, batch_size, None):
+                if batch:
+                    session.execute(insert(TradeDB), batch)
+
+        return len(rows)
+
+    @classmethod
+    def add_backtest_run(
+            cls,
+            symbol: str,
+            timeframe: TimeFrame | str,
+            trades: str | None = None,
+            strategy: str | None = None,
+            params: dict | None = None,
+    ) -> int:
+        """
+        Stores a backtest or filter search run, its results are stored with `add_filter_set_results`
+
+        :param symbol: trading symbol
+        :param timeframe: timeframe of the candles
+        :param trades: source of the evaluated trades, e.g. the trades CSV file
+        :param strategy: search strategy
+        :param params: JSON serializable parameters of the run
+        :return: id of the run
+        """
+        run = BacktestRunDB(
+            symbol=symbol.upper(),
+            timeframe=str(timeframe),
+            trades=trades,
+            strategy=strategy,
+            params=params,
+            created_at=datetime.now(),
+        )
+
+        with cls.sm() as session, session.begin():
+            session.add(run)
+
+        return run.id
+
+    @classmethod
+    def add_filter_set_results(cls, run_id: int, results: DataFrame, batch_size: int = 10_000) -> int:
+        """
+        Stores evaluated filter sets with bulk inserts of `batch_size` rows
+
+        :param run_id: id of the run returned by `add_backtest_run`
+        :param results: one row per filter set with its 'key', the JSON of `backtest.strategies.filter_set_key`,
+            the 'long' and 'short' conditions and any of the metric columns of `FilterSetResultDB`,
+            e.g. 'pnl' and 'trades' ('count' is accepted for 'trades')
+        :param batch_size: number of rows inserted per statement
+        :return: number of stored filter sets
+        """
+        with cls.sm() as session:
+            run = session.get(BacktestRunDB, run_id)
+
+        metrics = [
+            column for column in FilterSetResultDB.__table__.columns.keys()
+            if column not in ('id', 'run_id', 'symbol', 'timeframe', 'key', 'long', 'short')
+        ]
+        results = results.rename(columns={'count': 'trades'})
+
+        def value(x):
+            return None if x is None or isinstance(x, float) and isnan(x) else x
+
+        rows = [
+            {
+                'run_id': run_id,
+                'symbol': run.symbol,
+                'timeframe': run.timeframe,
+                'key': row['key'],
+                'long': row['long'],
+                'short': row['short'],
+                **{metric: value(row[metric]) for metric in metrics if metric in row},
+            }
+            for row in results.to_dict('records')
+        ]
+
+        with cls.sm() as session, session.begin():
+            for batch in get_batch(rows, batch_size, None):
+                if batch:
+                    session.execute(insert(FilterSetResultDB), batch)
+
+        return len(rows)
+
+    @classmethod
+    def get_top_filter_sets(
+            cls,
+            symbol: str,
+            timeframe: TimeFrame | str,
+            top: int = 10,
+            by: str = 'pnl',
+            run_id: int | None = None,
+            min_trades: int = 1,
+    ) -> DataFrame:
+        """
+        Reads the best stored filter sets of a symbol and timeframe, over every run by default
+
+        :param symbol: trading symbol
+        :param timeframe: timeframe of the candles
+        :param top: number of filter sets to read
+        :param by: metric column to rank by, the best being the highest
+        :param run_id: read only the filter sets of this run
+        :param min_trades: skip filter sets passing fewer trades
+        :return: filter sets with their run, conditions and metrics, best first
+        """
+        table = FilterSetResultDB.__table__
+        query = select(table).where(
+            table.c.symbol == symbol.upper(),
+            table.c.timeframe == str(timeframe),
+            table.c[by].is_not(None),
+            table.c.trades >= min_trades,
+        )
+
+        if run_id is not None:
+            query = query.where(table.c.run_id == run_id)
+
+        return read_sql(sql=query.order_by(table.c[by].desc()).limit(top), con=cls.engine)
+
+    @classmethod
+    def get_filter_set_keys(cls, symbol: str, timeframe: TimeFrame | str) -> set[str]:
+        """
+        Reads the keys of the filter sets already evaluated on a symbol and timeframe,
+            so a resumed search can skip them, see `add_filter_set_results`
+        """
+        table = FilterSetResultDB.__table__
+
+        with cls.engine.connect() as conn:
+            return set(conn.execute(select(table.c.key).distinct().where(
+                table.c.symbol == symbol.upper(),
+                table.c.timeframe == str(timeframe),
+            )).scalars())
+
     @classmethod
     def is_table_exists(cls, name: str):
         """
@@ -89,4 +402,5 @@ class Database:
         return inspect(cls.engine).has_table(name)
 
 
-Base.metadata.create_all(Database.engine)
+if DatabaseSettings.ENABLED:
+    Base.metadata.create_all(Database.engine)
@@ -0,0 +1,228 @@
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+
+from pandas import DataFrame, concat
+
+from utils import merge_intervals
+
+try:
+    from pyarrow import feather
+except ImportError:
+    feather = None
+
+
+class ColumnarStorage:
+    """
+    Local klines storage in Arrow IPC files, partitioned by symbol, timeframe and month:
+        `<root>/<SYMBOL>/<interval><unit>/<YYYY-MM>.arrow`
+
+    New klines are appended to a month as part files `<YYYY-MM>.<stamp>.part.arrow`, merged into the month
+        file once there are `max_parts` of them, so streamed chunks do not rewrite the month every time.
+    Files are written uncompressed, so reads are memory-mapped and only the requested columns are loaded.
+    """
+
+    max_parts: int = 16
+
+    def __init__(self, root: str | Path):
+        if feather is None:
+            raise ImportError("Columnar klines storage requires `pyarrow` to be installed.")
+
+        self.root = Path(root)
+
+    def klines_dir(self, symbol: str, interval: int, unit: str) -> Path:
+        return self.root / symbol.upper() / f'{interval}{unit}'
+
+    def partitions(self, symbol: str, interval: int, unit: str) -> dict[str, list[Path]]:
+        """
+        Files of every monthly partition of the klines keyed by month, in chronological order, see `month_files`
+        """
+        directory = self.klines_dir(symbol, interval, unit)
+        if not directory.is_dir():
+            return {}
+
+        months = sorted({path.name.split('.')[0] for path in directory.glob('*.arrow')})
+        return {month: self.month_files(directory, month) for month in months}
+
+    @staticmethod
+    def month_files(directory: Path, month: str) -> list[Path]:
+        """
+        Files of a monthly partition: the month file, if any, then its part files in the order they were written
+        """
+        path = directory / f'{month}.arrow'
+        return ([path] if path.exists() else []) + sorted(directory.glob(f'{month}.*.part.arrow'))
+
+    @staticmethod
+    def _read(path: Path, columns: list[str] | None = None) -> DataFrame:
+        table = feather.read_table(path, memory_map=True)
+        if columns is not None:
+            table = table.select([column for column in columns if column in table.column_names])
+        return table.to_pandas()
+
+    def _read_month(self, directory: Path, month: str, columns: list[str] | None = None) -> DataFrame:
+        """
+        Reads a monthly partition. For klines stored in several files, the values of later files replace
+            the ones of earlier files, column by column, so a part holding fewer columns keeps the stored values
+            of the other columns.
+
+        :return: klines of the month sorted by time, empty if the month is no longer stored
+        """
+        while True:
+            try:
+                frames = [self._read(path, columns) for path in self.month_files(directory, month)]
+                break
+            except FileNotFoundError:
+                # parts merged meanwhile, their rows are in the month file now
+                continue
+
+        if not frames:
+            return DataFrame(columns=['time'] if columns is None else columns)
+        if len(frames) == 1:
+            return frames[0]
+
+        order = list(dict.fromkeys(column for frame in frames for column in frame.columns))
+        return concat(frames, ignore_index=True).groupby('time', sort=True).last().reset_index()[order]
+
+    @staticmethod
+    def _write(table: DataFrame, path: Path):
+        """
+        Writes a partition atomically, so concurrent readers never see a partial file
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f'.{os.getpid()}.tmp')
+        feather.write_feather(table.reset_index(drop=True), tmp, compression='uncompressed')
+        os.replace(tmp, path)
+
+    def add_klines(self, table: DataFrame, symbol: str, interval: int, unit: str):
+        """
+        Adds klines to the monthly partitions they belong to. A new month is written to its file, klines of
+            a stored month to a part file, the parts being merged into the month file once there are
+            `max_parts` of them. Stored rows are replaced by the new ones with the same time.
+
+        :param table: klines with a 'time' column
+        :param symbol: trading symbol
+        :param interval: time interval of the klines
+        :param unit: time unit of the klines
+        """
+        directory = self.klines_dir(symbol, interval, unit)
+
+        for month, chunk in table.groupby(table['time'].dt.strftime('%Y-%m'), sort=True):
+            files = self.month_files(directory, month)
+
+            if not files:
+                self._write(chunk.sort_values('time'), directory / f'{month}.arrow')
+                continue
+
+            part = directory / f'{month}.{time.time_ns():020d}-{os.getpid()}.part.arrow'
+            self._write(chunk.sort_values('time'), part)
+            if len(files) >= self.max_parts:
+                self.compact_month(directory, month)
+
+    def compact_month(self, directory: Path, month: str):
+        """
+        Merges the part files of a month into the month file
+        """
+        parts = self.month_files(directory, month)[1:]
+        if not parts:
+            return
+
+        self._write(self._read_month(directory, month), directory / f'{month}.arrow')
+        for part in parts:
+            part.unlink(missing_ok=True)
+
+    def compact(self, symbol: str, interval: int, unit: str):
+        """
+        Merges the part files of every month of the klines into the month files
+        """
+        for month in self.partitions(symbol, interval, unit):
+            self.compact_month(self.klines_dir(symbol, interval, unit), month)
+
+    def get_klines(
+            self,
+            symbol: str,
+            interval: int,
+            unit: str,
+            start: datetime | None = None,
+            end: datetime | None = None,
+            columns: list[str] | None = None,
+    ) -> None | DataFrame:
+        """
+        Reads the stored klines, opening only the monthly partitions overlapping the time range
+
+        :param symbol: trading symbol
+        :param interval: time interval of the klines
+        :param unit: time unit of the klines
+        :param start: earliest kline time to load, inclusive
+        :param end: latest kline time to load, exclusive
+        :param columns: columns to load, every column by default; 'time' is always loaded
+        :return: klines sorted by time, or `None` if nothing is stored
+        """
+        partitions = self.partitions(symbol, interval, unit)
+        if not partitions:
+            return None
+
+        if columns is not None:
+            columns = ['time', *[column for column in columns if column != 'time']]
+
+        directory = self.klines_dir(symbol, interval, unit)
+        months = [
+            month for month in partitions
+            if (start is None or month >= f'{start:%Y-%m}') and (end is None or month <= f'{end:%Y-%m}')
+        ]
+        if not months:
+            return self._read(next(iter(partitions.values()))[0], columns).head(0)
+
+        klines = concat([self._read_month(directory, month, columns) for month in months], ignore_index=True)
+
+        if start is not None:
+            klines = klines[klines['time'] >= start]
+        if end is not None:
+            klines = klines[klines['time'] < end]
+
+        return klines.reset_index(drop=True)
+
+    def get_klines_range(self, symbol: str, interval: int, unit: str) -> None | tuple[datetime, datetime]:
+        """
+        Finds the first and the last stored kline time reading only the 'time' column of the edge partitions
+
+        :return: times of the first and the last kline, or `None` if nothing is stored
+        """
+        partitions = self.partitions(symbol, interval, unit)
+        if not partitions:
+            return None
+
+        directory = self.klines_dir(symbol, interval, unit)
+        first = self._read_month(directory, next(iter(partitions)), ['time'])['time']
+        last = self._read_month(directory, next(reversed(partitions)), ['time'])['time']
+        if first.empty or last.empty:
+            return None
+
+        return first.iloc[0].to_pydatetime(), last.iloc[-1].to_pydatetime()
+
+    def get_klines_coverage(self, symbol: str, interval: int, unit: str) -> list[tuple[datetime, datetime]]:
+        """
+        Reads the time intervals of klines which were already fetched from the exchange
+
+        :return: sorted, disjoint `(start, end)` intervals
+        """
+        path = self.klines_dir(symbol, interval, unit) / 'coverage.json'
+        if not path.exists():
+            return []
+
+        with open(path) as f:
+            return [(datetime.fromisoformat(start), datetime.fromisoformat(end)) for start, end in json.load(f)]
+
+    def add_klines_coverage(self, symbol: str, interval: int, unit: str, intervals: list[tuple[datetime, datetime]]):
+        """
+        Records time intervals of klines as fetched, merging them with the stored ones
+        """
+        path = self.klines_dir(symbol, interval, unit) / 'coverage.json'
+        coverage = merge_intervals([*self.get_klines_coverage(symbol, interval, unit), *intervals])
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f'.{os.getpid()}.tmp')
+        with open(tmp, 'w') as f:
+            json.dump([(start.isoformat(), end.isoformat()) for start, end in coverage], f)
+        os.replace(tmp, path)
@@ -8,7 +8,10 @@ from sqlalchemy import (
     DateTime,
     Enum as SAEnum,
     Numeric,
-    PickleType
+    PickleType,
+    JSON,
+    ForeignKey,
+    Index,
 )
 
 from utils import (
@@ -72,3 +75,83 @@ class TradeDB(Base):
     opened_at = Column(DateTime, nullable=True)
     closed_at = Column(DateTime, nullable=True)
     closed_by = Column(SAEnum(ClosedBy), nullable=True)
+
+
+class KlinesCoverageDB(Base):
+    """
+    A class to represent a time interval of klines which was already fetched from the exchange.
+
+    Attributes:
+        tablename: name of the klines table
+        start: start of the interval, inclusive
+        end: end of the interval, exclusive
+    """
+    __tablename__ = 'klines_coverage'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+
+    tablename = Column(String, nullable=False, index=True)
+    start = Column(DateTime, nullable=False)
+    end = Column(DateTime, nullable=False)
+
+
+class BacktestRunDB(Base):
+    """
+    A class to represent a backtest or filter search run in the database.
+
+    Attributes:
+        symbol: trading symbol
+        timeframe: timeframe of the candles
+        trades: source of the evaluated trades, e.g. the trades CSV file
+        strategy: search strategy which produced the filter sets
+        params: parameters of the run
+        created_at: time the run was stored
+    """
+    __tablename__ = 'backtest_runs'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+
+    symbol = Column(String, nullable=False)
+    timeframe = Column(String, nullable=False)
+    trades = Column(String, nullable=True)
+    strategy = Column(String, nullable=True)
+    params = Column(JSON, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+
+
+class FilterSetResultDB(Base):
+    """
+    A class to represent an evaluated filter set in the database.
+
+    Attributes:
+        run_id: id of the run which evaluated the filter set
+        symbol: trading symbol, copied from the run for the top-N queries
+        timeframe: timeframe of the candles, copied from the run
+        key: canonical JSON of the filter set conditions, independent of their order
+        long: conditions of the long trades
+        short: conditions of the short trades
+        pnl, trades, ...: metrics of the trades passing the filter set, see `backtest.METRICS`
+    """
+    __tablename__ = 'filter_set_results'
+    __table_args__ = (
+        Index('ix_filter_set_results_top', 'symbol', 'timeframe', 'pnl'),
+        Index('ix_filter_set_results_key', 'symbol', 'timeframe', 'key'),
+    )
+    id = Column(Integer, primary_key=True, autoincrement=True)
+
+    run_id = Column(Integer, ForeignKey('backtest_runs.id', ondelete='CASCADE'), nullable=False, index=True)
+    symbol = Column(String, nullable=False)
+    timeframe = Column(String, nullable=False)
+
+    key = Column(String, nullable=False)
+    long = Column(JSON, nullable=False)
+    short = Column(JSON, nullable=False)
+
+    pnl = Column(Float, nullable=True)
+    trades = Column(Integer, nullable=True)
+    winrate = Column(Float, nullable=True)
+    max_up = Column(Float, nullable=True)
+    worst = Column(Float, nullable=True)
+    max_drawdown = Column(Float, nullable=True)
+    profit_factor = Column(Float, nullable=True)
+    sharpe = Column(Float, nullable=True)
+    sortino = Column(Float, nullable=True)
+    expectancy = Column(Float, nullable=True)
@@ -1 +1,2 @@
 from ._base import Dataset
+from .features import FeatureCache
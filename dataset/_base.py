@@ -1,24 +1,55 @@
-from datetime import datetime
-from inspect import signature
+from datetime import datetime, timedelta
+from tempfile import TemporaryFile
+from typing import Iterable, Iterator
 
-from pandas import DataFrame, Series, concat
+from pandas import DataFrame, concat, option_context, isnull
+from pandas.api.types import is_numeric_dtype
 
-from numpy import ndarray, array
+from numpy import (
+    ndarray, array, empty, memmap, may_share_memory, maximum, errstate, log, exp, float32, float64, nan,
+)
 
-from .indicators import base as indicators
+from .indicators.registry import IndicatorRegistry
+from .indicators.parallel import compute_indicators
+from .features import FeatureCache
 from .apis import BinanceAPI, Exchanges
-from utils import TimeFrame
+from utils import TimeFrame, missing_intervals
 from database import Database
 
-indicators = [(name, func) for name, func in indicators.__dict__.items() if '__' not in name and callable(func)]
+KLINE_COLUMNS = ['time', 'open', 'high', 'low', 'close', 'volume']
+
+# Running totals, which restart from zero when recomputed on a slice of the history
+CUMULATIVE = ('AD', 'OBV', 'OBV_min_2', 'OBV_max_2', 'OBVe_4', 'OBVe_12', 'PVT', 'NVI_1', 'PVI_1')
+
+# Indicators whose every value depends on the whole series, e.g. a regression over all the klines. They are not
+# stored nor extended chunk by chunk, but computed over the loaded klines by `make`
+FULL_HISTORY = ('TOS_STDEVALL',)
+
+# Drawdowns from the highest close so far, whose peak restarts when recomputed on a slice of the history
+DRAWDOWN = ('DD', 'DD_PCT', 'DD_LOG')
 
 
 class Dataset:
     exchange: Exchanges = BinanceAPI
+    warmup: int = 1000
+
+    # Higher timeframes are resampled from the stored klines of this timeframe
+    base_timeframe: TimeFrame = TimeFrame(1, 'm')
 
-    def __init__(self, name: str, content: DataFrame | None = None):
+    # Indicators of at least `parallel_rows` klines are computed in a pool of processes, one per CPU by default
+    indicator_workers: int | None = None
+    parallel_rows: int = 100_000
+
+    def __init__(
+            self,
+            name: str,
+            content: DataFrame | None = None,
+            base_content: DataFrame | None = None,
+            timeframe: TimeFrame | None = None,
+    ):
         self.normalization_coefficients = {}
         self.name = name
+        self.timeframe = timeframe
 
         self.x_train: ndarray = array([])
         self.y_train: ndarray = array([])
@@ -29,7 +60,11 @@ class Dataset:
         self.is_ready: bool = False
 
         self.content: DataFrame = content
-        self.base_content = self.content[['time', 'open', 'high', 'low', 'close']].copy()
+        self.base_content = self.content[['time', 'open', 'high', 'low', 'close']].copy() \
+            if base_content is None else base_content
+
+        # columns spilled to a memory-mapped file by `compact`
+        self.spilled: memmap | None = None
 
     def __getitem__(self, item):
         """
@@ -37,18 +72,62 @@ class Dataset:
 
         :param item: The item or slice to retrieve.
         :return:
-        If `item` is a slice object, returns a new instance of the class with a subset of the content based on the slice
+        If `item` is a slice object, returns a new instance of the class with a subset of the content based on the slice.
+            The subset is a view sharing the buffers of this instance, nothing is copied.
         If `item` is a single index or a list of indices, returns the corresponding values from the content.
         """
         if isinstance(item, slice):
-            dataset = self.__class__(self.name, self.content.iloc[item])
+            dataset = self.__class__(self.name, self.content.iloc[item], self.base_content.iloc[item], self.timeframe)
             dataset.is_ready = self.is_ready
             dataset.normalization_coefficients = self.normalization_coefficients
-            dataset.base_content = self.base_content[item]
+            dataset.spilled = self.spilled
             return dataset
 
         return self.content[item]
 
+    def __len__(self):
+        return len(self.content)
+
+    def walk_forward(
+            self,
+            train: int | timedelta,
+            test: int | timedelta,
+            step: int | timedelta | None = None,
+            expanding: bool = False,
+    ) -> Iterator[tuple['Dataset', 'Dataset']]:
+        """
+        Lazily yields consecutive train and test windows, both views into this dataset.
+            Only windows with a complete test part are yielded.
+
+        :param train: length of the train windows, in candles or as a time span
+        :param test: length of the test windows, of the same kind as `train`
+        :param step: shift between consecutive windows, `test` by default
+        :param expanding: start every train window at the beginning of the dataset instead of shifting it
+        :return: iterator of `(train, test)` datasets
+        """
+        step = test if step is None else step
+
+        if isinstance(train, timedelta):
+            times = self.content['time']
+            if len(times) < 2:
+                return
+
+            # a test window is complete when it ends before the last candle closes
+            end = times.iloc[-1] + times.diff().min()
+            origin = times.iloc[0]
+
+            windows = []
+            while origin + train + test <= end:
+                windows.append((origin, origin + train, origin + train + test))
+                origin += step
+
+            bounds = times.searchsorted([bound for window in windows for bound in window]).reshape(-1, 3)
+        else:
+            bounds = [(i, i + train, i + train + test) for i in range(0, len(self) - train - test + 1, step)]
+
+        for start, middle, stop in bounds:
+            yield self[0 if expanding else start:middle], self[middle:stop]
+
     @classmethod
     def make(
             cls,
@@ -57,6 +136,9 @@ class Dataset:
             start: datetime,
             end: datetime,
             exchange: Exchanges = None,
+            columns: list[str] | None = None,
+            compact: bool = False,
+            memory_budget: int | None = None,
             **kwargs
     ):
         """
@@ -67,110 +149,454 @@ class Dataset:
         :param start: start datetime for the data retrieval
         :param end: end datetime for the data retrieval
         :param exchange: optional exchange parameter to specify the data source or exchange for fetching klines
+        :param columns: indicator columns to compute, every available indicator by default
+        :param compact: store the numeric columns as float32, see `compact`
+        :param memory_budget: bytes of the compact columns held in memory, see `compact`
         :param kwargs: additional keyword arguments to pass to the data fetching method
         :return: instance of the class with the data for the specified symbol and time range.
         """
         if exchange is not None:
             cls.exchange = exchange
 
-        changes = False
         interval, unit = timeframe.get(cls.exchange.__name__)
+        candle = timedelta(minutes=timeframe.minutes)
+        warmup = candle * cls.warmup
 
-        klines = Database.get_klines(symbol, interval, unit)
-        if klines is not None:
-            _start, *_, _end = klines['time']
-            timeline = ()
+        gaps = missing_intervals(
+            cls.align(start, candle),
+            min(cls.align(end - timedelta.resolution, candle) + candle, cls.align(cls.exchange.now(), candle)),
+            cls.get_coverage(symbol, interval, unit, candle),
+        )
 
-            if start.date() < _start.date():
-                changes = True
-                timeline += (cls.__parse_new_klines(symbol, interval, unit, start, _start), )
+        stored_columns = None
+        for gap_start, gap_end in gaps:
+            history = Database.get_klines(symbol, interval, unit, start=gap_start - warmup, end=gap_start)
+            if history is not None:
+                stored_columns = [column for column in history.columns if column not in KLINE_COLUMNS]
+
+            # without stored history right before the gap, the warm-up candles are fetched along with it
+            chunks = cls.__stream_new_klines(
+                klines=cls.iter_klines(
+                    symbol=symbol,
+                    timeframe=timeframe,
+                    start=gap_start if history is not None and not history.empty else gap_start - warmup,
+                    end=gap_end,
+                    **kwargs
+                ),
+                history=history,
+                columns=columns if stored_columns is None else stored_columns,
+            )
 
-            timeline += (klines, )
+            for klines in chunks:
+                klines = klines[(gap_start <= klines['time']) & (gap_end > klines['time'])]
+                if klines.empty:
+                    continue
 
-            if end.date() > _end.date():
-                changes = True
-                timeline += (cls.__parse_new_klines(symbol, interval, unit, _end, end), )
+                # only the stored candles are covered, so gaps the exchange did not fill are fetched again later
+                Database.add_klines(klines, symbol, interval, unit)
+                Database.add_klines_coverage(symbol, interval, unit, [(gap_start, klines['time'].iloc[-1] + candle)])
 
-            if len(timeline) > 1:
-                klines = concat(timeline).drop_duplicates().reset_index(drop=True)
+        klines = Database.get_klines(
+            symbol,
+            interval,
+            unit,
+            start=start if columns is None else start - warmup,
+            end=end,
+            columns=None if columns is None else [*KLINE_COLUMNS, *columns],
+        )
+        if klines is None:
+            klines = DataFrame(columns=KLINE_COLUMNS)
+
+        # full history columns are computed over the loaded klines, never read from the storage
+        full_history = [
+            column for column in (IndicatorRegistry.default().columns if columns is None else columns)
+            if column.startswith(FULL_HISTORY)
+        ]
+        klines = klines.drop(columns=full_history, errors='ignore')
+
+        missing = [column for column in (full_history if columns is None else columns) if column not in klines.columns]
+        if missing and not klines.empty:
+            features = FeatureCache.default().compute(klines, missing, symbol, interval, unit)
+            klines = concat((klines, features), axis=1)
+
+        dataset = cls(
+            name=Database.klines_tablename(symbol, interval, unit),
+            content=klines[start <= klines['time']][end > klines['time']],
+            timeframe=timeframe,
+        )
 
-        else:
-            changes = True
+        return dataset.compact(memory_budget) if compact else dataset
+
+    def compact(self, memory_budget: int | None = None, hot: Iterable[str] = (), spill_dir: str | None = None):
+        """
+        Converts the dataset into its compact representation: the numeric columns are stored as float32 in one
+            contiguous column-major array, 'open', 'high', 'low', 'close' and 'volume' first, so every column is
+            a contiguous slice and `base_content` is a view into the array instead of a copy. Prices keep about
+            7 significant digits.
+
+        When the array would take more than `memory_budget` bytes, the columns that do not fit are spilled
+            to a memory-mapped temporary file, the columns listed in `hot` being kept in memory first.
+            The prices are always kept in memory.
+
+        :param memory_budget: bytes of the numeric columns held in memory, unlimited by default
+        :param hot: indicator columns to keep in memory before the others
+        :param spill_dir: directory of the memory-mapped file, the system temporary directory by default
+        :return: compact dataset with the same name and columns, sharing no memory with this one
+        """
+        content = self.content
+        hot = set(hot)
+
+        numeric = [column for column in content.columns if column != 'time' and is_numeric_dtype(content[column])]
+        others = [column for column in content.columns if column not in numeric]
+
+        prices = [column for column in KLINE_COLUMNS if column in numeric]
+        columns = [
+            *prices,
+            *[column for column in numeric if column not in prices and column in hot],
+            *[column for column in numeric if column not in prices and column not in hot],
+        ]
+
+        resident = len(columns)
+        if memory_budget is not None and len(content):
+            resident = min(resident, max(len(prices), memory_budget // (len(content) * float32().itemsize)))
+
+        values = empty((len(content), resident), dtype=float32, order='F')
+        spilled = None
+        if resident < len(columns):
+            spilled = memmap(
+                TemporaryFile(dir=spill_dir),
+                dtype=float32,
+                mode='w+',
+                shape=(len(content), len(columns) - resident),
+                order='F',
+            )
+
+        for i, column in enumerate(columns):
+            target = values[:, i] if i < resident else spilled[:, i - resident]
+            target[:] = content[column].to_numpy(dtype=float32)
+
+        # copy-on-write lets `concat` keep the blocks as views into `values` and `spilled`
+        with option_context('mode.copy_on_write', True):
+            frames = [content[others], DataFrame(values, index=content.index, columns=columns[:resident], copy=False)]
+            if spilled is not None:
+                frames.append(DataFrame(spilled, index=content.index, columns=columns[resident:], copy=False))
+
+            compact = concat(frames, axis=1)
+            base_content = concat((
+                content[['time']],
+                DataFrame(values[:, :4], index=content.index, columns=columns[:4], copy=False)
+            ), axis=1)
+
+        dataset = self.__class__(self.name, compact, base_content, self.timeframe)
+        dataset.is_ready = self.is_ready
+        dataset.normalization_coefficients = self.normalization_coefficients
+        dataset.spilled = spilled
+        return dataset
+
+    def memory_usage(self) -> dict[str, int]:
+        """
+        Reports the memory footprint of the dataset
+
+        :return: bytes of the content held in memory ('resident') and spilled to a memory-mapped file ('mapped'),
+            of the `base_content` copy of the prices ('base_content', zero when it is a view) and their 'total'
+        """
+        usage = {'resident': 0, 'mapped': 0, 'base_content': 0}
+
+        for column, size in self.content.memory_usage(index=True, deep=True).items():
+            if column != 'Index' and self.spilled is not None and \
+                    may_share_memory(self.content[column].to_numpy(), self.spilled):
+                usage['mapped'] += size
+            else:
+                usage['resident'] += size
+
+        for column in self.base_content.columns:
+            values = self.base_content[column].to_numpy()
+            if column not in self.content.columns or not may_share_memory(values, self.content[column].to_numpy()):
+                usage['base_content'] += values.nbytes
+
+        usage['total'] = sum(usage.values())
+        return usage
+
+    @classmethod
+    def align(cls, time: datetime, candle: timedelta) -> datetime:
+        """
+        Rounds a time down to the open time of the candle containing it
+        """
+        return time - (time - cls.exchange.epoch) % candle
+
+    @classmethod
+    def get_coverage(cls, symbol: str, interval: int, unit: str, candle: timedelta) -> list[tuple[datetime, datetime]]:
+        """
+        Time intervals of klines already fetched from the exchange. Tables stored before the coverage was
+            recorded are indexed once from the runs of consecutive candles they contain.
+
+        :param symbol: trading symbol
+        :param interval: time interval of the klines
+        :param unit: time unit of the klines
+        :param candle: duration of a candle
+        :return: sorted, disjoint `(start, end)` intervals
+        """
+        coverage = Database.get_klines_coverage(symbol, interval, unit)
+        if coverage:
+            return coverage
+
+        klines = Database.get_klines(symbol, interval, unit, columns=['time'])
+        if klines is None or klines.empty:
+            return []
+
+        times = klines['time']
+        breaks = times.diff() != candle
+        coverage = [
+            (run.iloc[0].to_pydatetime(), run.iloc[-1].to_pydatetime() + candle)
+            for _, run in times.groupby(breaks.cumsum())
+        ]
+
+        Database.add_klines_coverage(symbol, interval, unit, coverage)
+        return coverage
+
+    @classmethod
+    def iter_klines(
+            cls,
+            symbol: str,
+            timeframe: TimeFrame,
+            start: datetime,
+            end: datetime,
+            **kwargs
+    ) -> Iterator[DataFrame]:
+        """
+        Streams raw klines of a candle-aligned time range. Timeframes above `base_timeframe` are resampled
+            from the stored base klines where those cover the range; only the uncovered head of the range,
+            if any, is fetched from the exchange.
+
+        :param symbol: market symbol
+        :param timeframe: timeframe of the klines
+        :param start: start of the range, aligned to the candles
+        :param end: end of the range, aligned to the candles
+        :param kwargs: additional parameters that may be passed to the exchange's `iter_klines` method
+        :return: iterator of klines with 'time', 'open', 'high', 'low', 'close' and 'volume' columns
+        """
+        interval, unit = timeframe.get(cls.exchange.__name__)
+        candle = timedelta(minutes=timeframe.minutes)
+        resampled_from = end
+
+        if timeframe.minutes > cls.base_timeframe.minutes and timeframe.minutes % cls.base_timeframe.minutes == 0:
+            base_interval, base_unit = cls.base_timeframe.get(cls.exchange.__name__)
+            base_candle = timedelta(minutes=cls.base_timeframe.minutes)
 
-            klines = cls.__parse_new_klines(
+            base_gaps = missing_intervals(start, end, cls.get_coverage(symbol, base_interval, base_unit, base_candle))
+            covered_from = start if not base_gaps else cls.align(base_gaps[-1][1] - timedelta.resolution, candle) + candle
+
+            if covered_from < end:
+                resampled_from = covered_from
+
+        if start < resampled_from:
+            yield from cls.exchange.iter_klines(
                 symbol=symbol,
                 interval=interval,
                 unit=unit,
                 start=start,
-                end=end,
+                end=resampled_from,
                 **kwargs
             )
 
-        if changes and not klines.empty:
-            Database.add_klines(klines, symbol, interval, unit)
-
-        return cls(
-            name=Database.klines_tablename(symbol, interval, unit),
-            content=klines[start <= klines['time']][end > klines['time']]
-        )
+        if resampled_from < end:
+            yield from cls.resample_klines(symbol, timeframe, resampled_from, end)
 
     @classmethod
-    def __parse_new_klines(
+    def resample_klines(
             cls,
             symbol: str,
-            interval: int,
-            unit: str,
+            timeframe: TimeFrame,
             start: datetime,
             end: datetime,
-            **kwargs
-    ):
+            size: timedelta = timedelta(days=30),
+    ) -> Iterator[DataFrame]:
         """
-        Fetch and process kline (candlestick) data for a given trading symbol, time interval, and time range.
-            Additionally, compute and append selected technical indicators to the kline data.
+        Builds klines of a higher timeframe from the stored `base_timeframe` klines, reading them in windows
+            of about `size`. Candles are aligned to the exchange epoch like the exchange's own.
 
-        :param symbol: symbol for which to fetch the kline data
-        :param interval: time interval for the klines
-        :param unit: unit of the interval (e.g., 'm' for minutes, 'h' for hours)
-        :param start: start datetime for fetching klines
-        :param end: end datetime for fetching klines
-        :param kwargs: additional parameters that may be passed to the exchange's `get_klines` method
-        :return:
+        :param symbol: market symbol
+        :param timeframe: timeframe of the built klines, a multiple of `base_timeframe`
+        :param start: start of the range, aligned to the candles
+        :param end: end of the range, aligned to the candles
+        :param size: length of the base klines window read at once
+        :return: iterator of klines with 'time', 'open', 'high', 'low', 'close' and 'volume' columns
         """
-        klines = cls.exchange.get_klines(
-            symbol=symbol,
-            interval=interval,
-            unit=unit,
-            start=start,
-            end=end,
-            **kwargs
+        interval, unit = cls.base_timeframe.get(cls.exchange.__name__)
+        candle = timedelta(minutes=timeframe.minutes)
+        size = candle * max(1, size // candle)
+
+        while start < end:
+            stop = min(start + size, end)
+
+            klines = Database.get_klines(symbol, interval, unit, start=start, end=stop, columns=KLINE_COLUMNS)
+            if klines is not None and not klines.empty:
+                yield cls.resample(klines[KLINE_COLUMNS], candle)
+
+            start = stop
+
+    @classmethod
+    def resample(cls, klines: DataFrame, candle: timedelta) -> DataFrame:
+        """
+        Aggregates klines into candles of a longer duration, dropping the candles without any kline
+
+        :param klines: klines with 'time', 'open', 'high', 'low', 'close' and 'volume' columns
+        :param candle: duration of the built candles
+        :return: klines of the longer candles
+        """
+        candles = klines.resample(candle, on='time', origin=cls.exchange.epoch, closed='left', label='left').agg({
+            'open': 'first',
+            'high': 'max',
+            'low': 'min',
+            'close': 'last',
+            'volume': 'sum',
+        })
+
+        return candles.dropna(subset=['open']).reset_index()
+
+    @classmethod
+    def __stream_new_klines(
+            cls,
+            klines: Iterable[DataFrame],
+            history: DataFrame | None = None,
+            columns: list[str] | None = None,
+    ) -> Iterator[DataFrame]:
+        """
+        Process kline (candlestick) data, computing and appending selected technical indicators to it.
+
+            Klines are processed chunk by chunk as they arrive, every chunk warmed up by the tail
+            of the previous one, so that only one chunk and `warmup` rows of history are held in memory.
+            Without `columns` or `history`, the indicator columns are chosen on the first chunk.
+
+        :param klines: raw klines in chronological order, chunk by chunk
+        :param history: already processed klines right before the first chunk, used to warm up the indicators
+        :param columns: indicator columns to compute, every available indicator by default
+        :return: iterator of processed klines in chronological order
+        """
+        if history is not None and history.empty:
+            history = None
+
+        pending = None
+
+        for chunk in klines:
+            if history is None:
+                # the first rows are computed once `warmup` klines have arrived, so that they can warm up the next chunks
+                pending = chunk if pending is None else concat([pending, chunk], ignore_index=True)
+                if len(pending) < cls.warmup:
+                    continue
+
+                values, pending = cls.calculate_indicators_values(pending, columns), None
+            else:
+                values = cls.extend_indicators_values(history, chunk)
+
+            if values.empty:
+                continue
+
+            history = values if history is None else concat([history, values], ignore_index=True)
+            history = history.iloc[-cls.warmup:]
+            yield values
+
+        if pending is not None:
+            values = cls.calculate_indicators_values(pending, columns)
+            if not values.empty:
+                yield values
+
+    @classmethod
+    def extend_indicators_values(cls, history: DataFrame, klines: DataFrame) -> DataFrame:
+        """
+        Computes indicators for klines that follow the already processed `history`.
+            Only the last `warmup` rows of the history are recomputed, so that rolling indicators are correct
+            at the seam, running totals are shifted to continue from their stored values and drawdowns
+            continue from the peak close of the stored ones.
+
+        :param history: processed klines with indicator columns, sorted by time
+        :param klines: raw klines following the history
+        :return: processed klines newer than the history, with the same columns as the history
+        """
+        history = history.iloc[-cls.warmup:]
+        last = history['time'].iloc[-1]
+
+        klines = klines[klines['time'] > last]
+        if klines.empty:
+            return klines.reindex(columns=history.columns)
+
+        values = cls.calculate_indicators_values(
+            concat([history[klines.columns], klines], ignore_index=True),
+            [column for column in history.columns if column not in klines.columns],
         )
-        return cls.calculate_indicators_values(klines)
+
+        seam = values[values['time'] == last]
+        if not seam.empty:
+            for column in CUMULATIVE:
+                if column in values.columns and column in history.columns:
+                    values[column] += history[column].iloc[-1] - seam[column].iloc[0]
+
+        drawdown = [column for column in DRAWDOWN if column in values.columns and column in history.columns]
+        if drawdown:
+            new = (values['time'] > last).to_numpy()
+            close = values['close'].to_numpy(dtype=float64)[new]
+            peak = maximum.accumulate(maximum(close, cls.peak_close(history)))
+
+            with errstate(divide='ignore', invalid='ignore'):
+                dd = {'DD': peak - close, 'DD_PCT': 1 - close / peak, 'DD_LOG': log(peak) - log(close)}
+            for column in drawdown:
+                values.loc[new, column] = dd[column]
+
+        return values[values['time'] > last].reindex(columns=history.columns)
 
     @staticmethod
-    def calculate_indicators_values(klines):
-        indicators_df = DataFrame()
+    def peak_close(history: DataFrame) -> float:
+        """
+        Highest close up to the last row of processed klines, read back from their drawdown columns
 
-        for name, indicator in indicators:
-            args = [param.name.removesuffix('_') for param in signature(
-                indicator).parameters.values() if param.default and param.name != 'kwargs']
+        :param history: processed klines with at least one of the `DRAWDOWN` columns, sorted by time
+        :return: peak close the drawdowns of the last row are measured from
+        """
+        row = history.iloc[-1]
+        close = float(row['close'])
 
-            try:
-                resp = indicator(*[klines[col] for col in args])
-            except Exception:
-                continue
+        if 'DD' in row and not isnull(row['DD']):
+            return close + row['DD']
+        if 'DD_PCT' in row and not isnull(row['DD_PCT']) and row['DD_PCT'] < 1:
+            return close / (1 - row['DD_PCT'])
+        if 'DD_LOG' in row and not isnull(row['DD_LOG']):
+            return close * exp(row['DD_LOG'])
 
-            if isinstance(resp, DataFrame):
-                if all(resp.count() < len(indicators_df) * .9):
-                    continue
+        return float(history['close'].max())
 
-                resp.drop(columns=[col for col in resp.columns if len(resp[col]) * .9 > resp[
-                    col].count() or col in indicators_df.columns], inplace=True)
-                indicators_df = concat([indicators_df, resp], axis=1)
+    @classmethod
+    def calculate_indicators_values(cls, klines: DataFrame, columns: list[str] | None = None) -> DataFrame:
+        """
+        Appends technical indicator columns to the klines and drops the rows where any of them is missing
 
-            elif isinstance(resp, Series):
-                if resp.count() < len(indicators_df) * .9:
-                    continue
-                indicators_df = concat([indicators_df, resp], names=[*indicators_df.columns, name], axis=1)
+        :param klines: klines with 'open', 'high', 'low', 'close' and 'volume' columns
+        :param columns: indicator columns to compute; by default every indicator is computed with its default
+            parameters, keeping only the columns which are at least 90% non-null. From `parallel_rows` klines on,
+            the indicators run in a pool of `indicator_workers` processes. `FULL_HISTORY` columns are left out.
+        :return: klines with indicator columns, in the definition order of the indicators
+        """
+        if columns is not None:
+            columns = [column for column in columns if not column.startswith(FULL_HISTORY)]
+            return concat((klines, IndicatorRegistry.default().compute(klines, columns)), axis=1).dropna()
+
+        outputs = compute_indicators(
+            klines,
+            threshold=len(klines) * .9,
+            workers=cls.indicator_workers if len(klines) >= cls.parallel_rows else 1,
+        )
 
-        return concat((klines, indicators_df), axis=1).dropna()
+        kept, seen = [], set()
+        for resp in outputs:
+            if resp is None:
+                continue
 
+            resp_columns = [col for col in resp.columns if col not in seen and not col.startswith(FULL_HISTORY)]
+            seen.update(resp_columns)
+            kept.extend((resp, col) for col in resp_columns)
+
+        values = empty((len(klines), len(kept)), dtype=float64, order='F')
+        for i, (resp, col) in enumerate(kept):
+            values[:, i] = resp[col].to_numpy(dtype=float64, na_value=nan)
+
+        indicators_df = DataFrame(values, index=klines.index, columns=[col for _, col in kept], copy=False)
+        return concat((klines, indicators_df), axis=1).dropna()
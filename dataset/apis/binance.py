@@ -1,8 +1,17 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from itertools import islice
+from math import ceil
+from typing import Iterator
 import time
 
 from binance import Client
-from pandas import DataFrame, Series
+from numpy import ndarray, array, empty, unique
+from pandas import DataFrame, concat
+
+from .ratelimit import TokenBucket
+from utils import TimeFrame
 
 
 class BinanceAPI:
@@ -10,13 +19,26 @@ class BinanceAPI:
 
     __name__ = 'BinanceAPI'
 
+    # Kline times are converted to naive local time
+    epoch: datetime = datetime.fromtimestamp(0)
+
+    # Binance allows 6000 request weight per minute, a klines request of up to 1000 candles weighs 2
+    weight_limit: int = 6000
+    klines_weight: int = 2
+    klines_per_request: int = 1000
+    limiter = TokenBucket(capacity=weight_limit, rate=weight_limit / 60)
+
+    @staticmethod
+    def now() -> datetime:
+        return datetime.now()
+
     @classmethod
     def __get_klines_batch(
             cls,
             symbol: str,
             interval_str: str,
-            start: int,
-            end: int,
+            start: datetime,
+            end: datetime,
             retries: int = 20,
             retry_sleep_time: float = 20,
     ):
@@ -25,8 +47,8 @@ class BinanceAPI:
 
         :param symbol: trading symbol (e.g., 'BTCUSDT') for which to fetch kline data
         :param interval_str: interval as a string (e.g., '1m', '5m', '1h') for the klines
-        :param start: start timestamp (in milliseconds) for fetching klines.
-        :param end: end timestamp (in milliseconds) for fetching klines.
+        :param start: start datetime for fetching klines, inclusive
+        :param end: end datetime for fetching klines, exclusive
         :param retries:  number of times to retry fetching data in case of failure
         :param retry_sleep_time: number of seconds to wait between retries
         :return: list of kline data if successful, or None if all retries fail
@@ -36,8 +58,8 @@ class BinanceAPI:
                 return cls.client.get_historical_klines(
                     symbol=symbol,
                     interval=interval_str,
-                    start_str=f'{start:%Y-%m-%d}',
-                    end_str=f'{end:%Y-%m-%d}',
+                    start_str=int(start.timestamp() * 1000),
+                    end_str=int(end.timestamp() * 1000) - 1,
                 )
             except Exception as e:
                 print(f"{retry}. {e}")
@@ -52,39 +74,54 @@ class BinanceAPI:
         :param klines: kline data where each element is a list or tuple representing the kline attributes
         :return:
         """
-        df = DataFrame(
-            klines,
-            columns=[
-                "time",
-                "open",
-                "high",
-                "low",
-                "close",
-                "volume",
-                "CloseTime",
-                "QuoteVolume",
-                "NumberOfTrades",
-                "TakerBuyBaseVolume",
-                "TakerBuyQuoteVolume",
-                "Ignore",
-            ],
-        )
-        df.drop(
-            labels=[
-                "CloseTime",
-                "QuoteVolume",
-                "NumberOfTrades",
-                "TakerBuyBaseVolume",
-                "TakerBuyQuoteVolume",
-                "Ignore",
-            ],
-            axis=1,
-            inplace=True,
-        )
-        df = df.astype("float", copy=True)
-        df['time'] = Series(map(lambda el: datetime.fromtimestamp(el // 1000), df['time']))
+        values = array(klines, dtype=object)[:, :6] if klines else empty((0, 6), dtype=object)
+
+        df = DataFrame(values[:, 1:], columns=["open", "high", "low", "close", "volume"]).astype("float")
+        df.insert(0, 'time', cls.__ms_to_datetime(values[:, 0].astype('int64')))
         return df
 
+    @staticmethod
+    def __ms_to_datetime(ms: ndarray) -> ndarray:
+        """
+        Converts epoch milliseconds to naive local times, truncated to seconds like `datetime.fromtimestamp`.
+            The UTC offset is looked up once per quarter of an hour, the granularity of time zone changes.
+        """
+        seconds = ms // 1000
+        quarters, inverse = unique(seconds // 900, return_inverse=True)
+
+        offsets = array([
+            (datetime.fromtimestamp(quarter * 900) - datetime(1970, 1, 1)).total_seconds() - quarter * 900
+            for quarter in quarters.tolist()
+        ], dtype='int64')
+
+        return (seconds + offsets[inverse]).astype('datetime64[s]').astype('datetime64[ns]')
+
+    @staticmethod
+    def windows(start: datetime, end: datetime, size: timedelta = timedelta(days=15)) -> list[tuple[datetime, datetime]]:
+        """
+        Splits a time range into consecutive windows fetched by separate batch requests
+
+        :param start: start of the range
+        :param end: end of the range
+        :param size: maximum length of a window
+        :return: list of `(start, end)` windows in chronological order
+        """
+        windows = []
+
+        while start < end:
+            windows.append((start, min(start + size, end)))
+            start = windows[-1][1]
+
+        return windows
+
+    @classmethod
+    def window_weight(cls, start: datetime, end: datetime, interval: int, unit: str) -> int:
+        """
+        Estimates the request weight `client.get_historical_klines` spends on a window
+        """
+        candle = timedelta(minutes=interval * TimeFrame.__graduation__.get(unit, 1440))
+        return ceil((end - start) / candle / cls.klines_per_request + 1) * cls.klines_weight
+
     @classmethod
     def get_klines(
             cls,
@@ -96,6 +133,7 @@ class BinanceAPI:
             retries: int = 20,
             retry_sleep_time: float = 20,
             sleep_time: float = 0.2,
+            workers: int = 1,
     ):
         """
         Retrieves historical kline (candlestick) data for a specified symbol and interval from the exchange
@@ -108,30 +146,99 @@ class BinanceAPI:
         :param retries: number of times to retry fetching data in case of failure
         :param retry_sleep_time: number of seconds to wait between retries.
         :param sleep_time: number of seconds to wait between each batch request to avoid rate limiting
+        :param workers: number of windows fetched concurrently; when more than one, requests are paced
+            by the request weight limiter instead of `sleep_time`
         :return: pandas DataFrame containing the kline data with columns:
             "time", "open", "high", "low", "close", "volume"
         """
-        _klines = []
+        chunks = list(cls.iter_klines(
+            symbol=symbol,
+            interval=interval,
+            unit=unit,
+            start=start,
+            end=end,
+            retries=retries,
+            retry_sleep_time=retry_sleep_time,
+            sleep_time=sleep_time,
+            workers=workers,
+        ))
 
-        if end - start < timedelta(days=15):
-            kline_time_ms = timedelta(seconds=(end - start).total_seconds())
-        else:
-            kline_time_ms = timedelta(days=15)
+        if not chunks:
+            return cls.__make_df([])
+        return concat(chunks, ignore_index=True)
 
-        while True:
-            if start >= end:
-                break
-            _end = start + kline_time_ms
+    @classmethod
+    def iter_klines(
+            cls,
+            symbol: str,
+            interval: int,
+            unit: str,
+            start: datetime,
+            end: datetime,
+            retries: int = 20,
+            retry_sleep_time: float = 20,
+            sleep_time: float = 0.2,
+            workers: int = 1,
+    ) -> Iterator[DataFrame]:
+        """
+        Streams historical klines window by window, converting every batch into a DataFrame as soon as
+            it arrives, so that only a few windows of raw klines are held in memory at once
+
+        :param symbol: trading symbol (e.g., 'BTCUSDT') for which to fetch kline data
+        :param interval: interval for each kline in minutes (e.g., 1, 5, 15, 60)
+        :param unit: unit of the interval (e.g., 'm' for minutes, 'h' for hours).
+        :param start: starting datetime for fetching klines.
+        :param end: ending datetime for fetching klines.
+        :param retries: number of times to retry fetching data in case of failure
+        :param retry_sleep_time: number of seconds to wait between retries.
+        :param sleep_time: number of seconds to wait between each batch request to avoid rate limiting
+        :param workers: number of windows fetched concurrently; when more than one, requests are paced
+            by the request weight limiter instead of `sleep_time`
+        :return: iterator of DataFrames with columns "time", "open", "high", "low", "close", "volume",
+            in chronological order
+        """
+        def fetch(window: tuple[datetime, datetime]) -> DataFrame:
+            if workers > 1:
+                cls.limiter.acquire(cls.window_weight(*window, interval, unit))
 
-            _klines.extend(cls.__get_klines_batch(
+            batch = cls.__get_klines_batch(
                 symbol=symbol,
                 interval_str=f"{interval}{unit}",
-                start=start,
-                end=_end,
+                start=window[0],
+                end=window[1],
                 retries=retries,
                 retry_sleep_time=retry_sleep_time,
-            ))
+            )
+
+            if batch is None:
+                raise ConnectionError(f"Unable to fetch {symbol} klines from {window[0]} to {window[1]}")
+
+            if workers <= 1:
+                time.sleep(sleep_time)
+            return cls.__make_df(batch)
+
+        windows = iter(cls.windows(start, end))
+        last = None
+
+        def chunks() -> Iterator[DataFrame]:
+            if workers <= 1:
+                yield from map(fetch, windows)
+                return
+
+            # windows are submitted only a little ahead of the consumer, keeping the results in order
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                pending = deque(pool.submit(fetch, window) for window in islice(windows, workers * 2))
+                while pending:
+                    chunk = pending.popleft().result()
+                    for window in islice(windows, 1):
+                        pending.append(pool.submit(fetch, window))
+                    yield chunk
+
+        for chunk in chunks():
+            if last is not None:
+                chunk = chunk[chunk['time'] > last]
+            chunk = chunk.drop_duplicates('time', ignore_index=True)
 
-            time.sleep(sleep_time)
-            start = _end
-        return cls.__make_df(_klines)
+            if not chunk.empty:
+                last = chunk['time'].iloc[-1]
+            yield chunk
@@ -1,9 +1,12 @@
-import time
-from datetime import datetime
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Iterator
 
-from requests import Session
+from aiohttp import ClientSession, ClientError, ClientTimeout, TCPConnector
 from pandas import DataFrame, to_datetime, concat
 
+from .ratelimit import TokenBucket
+
 
 class PolygonAPI:
     DOMAIN: str = 'https://api.polygon.io/'
@@ -11,17 +14,39 @@ class PolygonAPI:
 
     __name__ = 'PolygonAPI'
 
+    # Kline times are naive UTC
+    epoch: datetime = datetime(1970, 1, 1)
+
+    # The free plan allows 5 requests per minute
+    requests_per_minute: int = 5
+    limiter = TokenBucket(capacity=requests_per_minute, rate=requests_per_minute / 60)
+
+    connections: int = 10
+    retries: int = 8
+    backoff: float = 1
+    max_backoff: float = 65
+    timeout: float = 60
+
+    klines_limit: int = 50000
+    window: timedelta = timedelta(days=30)
+
+    @staticmethod
+    def now() -> datetime:
+        return datetime.now(timezone.utc).replace(tzinfo=None)
+
     @staticmethod
-    def __datetime_to_str(start: datetime, end: datetime) -> (str, str):
+    def __datetime_to_str(start: datetime, end: datetime) -> str:
         """
-        Converts the start and end datetime objects to formatted strings.
+        Converts the start and end datetime objects to epoch millisecond strings.
 
-        :param start: starting datetime object.
-        :param end: ending datetime object.
-        :return: tuple containing the formatted start and end date strings
+        :param start: starting naive UTC datetime, inclusive
+        :param end: ending naive UTC datetime, inclusive
+        :return: string with the formatted start and end timestamps
         """
+        def ms(time: datetime) -> int:
+            return int(time.replace(tzinfo=timezone.utc).timestamp() * 1000)
 
-        return f'{start:%Y-%m-%d}/{end:%Y-%m-%d}'
+        return f'{ms(start)}/{ms(end)}'
 
     @staticmethod
     def __timeframe_to_str(interval: int, unit: str) -> (str, str):
@@ -62,8 +87,7 @@ class PolygonAPI:
         if resp is None:
             return DataFrame()
 
-        df = DataFrame.from_dict(resp)
-        df = df[['t', 'o', 'h', 'l', 'c', 'v']]
+        df = DataFrame.from_dict(resp).reindex(columns=['t', 'o', 'h', 'l', 'c', 'v'])
         df['t'] = to_datetime(df['t'], unit='ms')
         return df.rename(columns={
             't': 'time', 'o': 'open', 'h': 'high', 'l': 'low', 'c': 'close', 'v': 'volume'})
@@ -99,6 +123,97 @@ class PolygonAPI:
 
         return cls.DOMAIN + f'v3/reference/tickers' + cls.__params_to_str(kwargs) + cls.API_KEY
 
+    @classmethod
+    def session(cls) -> ClientSession:
+        """
+        HTTP session with a pool of `connections` keep-alive connections
+        """
+        return ClientSession(
+            connector=TCPConnector(limit=cls.connections),
+            timeout=ClientTimeout(total=cls.timeout),
+        )
+
+    @staticmethod
+    def _run(coroutine, loop: asyncio.AbstractEventLoop | None = None):
+        """
+        Runs a coroutine from synchronous code. The blocking methods cannot be called from a running event loop,
+            e.g. in a notebook or an async application, where the `*_async` methods are awaited instead.
+
+        :param coroutine: coroutine to run
+        :param loop: event loop kept open between calls, a new one is used by default
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(coroutine) if loop is None else loop.run_until_complete(coroutine)
+
+        coroutine.close()
+        raise RuntimeError(
+            "PolygonAPI blocking methods cannot run inside an event loop, await the *_async methods instead")
+
+    @classmethod
+    async def _request(cls, session: ClientSession, url: str) -> dict:
+        """
+        Requests a URL under the rate limiter, retrying rate limited (429), server side (5xx) and failed
+            requests with exponential backoff
+
+        :param session: HTTP session
+        :param url: URL to request
+        :return: decoded JSON response
+        :raises ConnectionError: on other client errors, e.g. a wrong API key or ticker, or once the retries
+            are exhausted
+        """
+        for retry in range(cls.retries):
+            await cls.limiter.acquire_async()
+
+            try:
+                async with session.get(url) as resp:
+                    status = resp.status
+                    body = (await resp.json(content_type=None) or {}) if status < 400 else {'error': await resp.text()}
+
+            except (ClientError, asyncio.TimeoutError, ValueError) as e:
+                print(f"{retry}. {e}")
+
+            else:
+                error = str(body.get('error', ''))
+
+                if status != 429 and status < 500 and 'maximum requests per minute' not in error:
+                    if status >= 400:
+                        raise ConnectionError(f"Request to {url.split('?')[0]} failed with status {status}: {error}")
+                    return body
+
+            await asyncio.sleep(min(cls.backoff * 2 ** retry, cls.max_backoff))
+
+        raise ConnectionError(f"Unable to request {url.split('?')[0]}")
+
+    @classmethod
+    async def get_symbols_async(cls, session: ClientSession, **kwargs) -> dict:
+        """
+        Retrieve and return a dictionary of trading symbols with their associated metadata, following
+            the pagination of the API
+
+        :param session: HTTP session
+        :param kwargs: additional query parameters of the request
+        :return: dictionary of symbol metadata keyed by the symbols (tickers)
+        """
+        symbols = {}
+
+        url = cls.get_symbols_link(limit='1000', active='true', **kwargs)
+        while True:
+            resp = await cls._request(session, url)
+            if resp.get('error'):
+                break
+
+            for item in resp.get('results', []):
+                symbols[item.pop('ticker')] = item
+
+            url = resp.get('next_url')
+            if url is None:
+                break
+            url += '&' + cls.API_KEY
+
+        return symbols
+
     @classmethod
     def get_symbols(cls, **kwargs):
         """
@@ -114,32 +229,137 @@ class PolygonAPI:
                   containing metadata for each symbol.
 
         """
-        symbols = {}
+        async def run():
+            async with cls.session() as session:
+                return await cls.get_symbols_async(session, **kwargs)
+
+        return cls._run(run())
+
+    @classmethod
+    def windows(cls, start: datetime, end: datetime) -> list[tuple[datetime, datetime]]:
+        """
+        Splits a time range into consecutive windows of at most `window`, fetched concurrently
+        """
+        windows = []
+
+        while start < end:
+            windows.append((start, min(start + cls.window, end)))
+            start = windows[-1][1]
 
-        with Session() as s:
-            url = cls.get_symbols_link(
-                limit='1000',
-                active='true',
+        return windows
+
+    @classmethod
+    async def get_window_async(
+            cls,
+            session: ClientSession,
+            symbol: str,
+            interval: int,
+            unit: str,
+            start: datetime,
+            end: datetime,
+            **kwargs: str
+    ) -> DataFrame:
+        """
+        Fetches the candles of one window, following the pages while they come back full
+
+        :param session: HTTP session
+        :param symbol: trading symbol
+        :param interval: interval for k_lines data
+        :param unit: unit of the interval
+        :param start: start of the window, inclusive
+        :param end: end of the window, exclusive
+        :return: pandas DataFrame with the candles of the window
+        """
+        pages = []
+        cursor = start
+
+        while cursor < end:
+            resp = await cls._request(session, cls.get_candles_link(
+                symbol=symbol,
+                tf=cls.__timeframe_to_str(interval, unit),
+                timeline=cls.__datetime_to_str(cursor, end - timedelta(milliseconds=1)),
+                limit=str(cls.klines_limit),
                 **kwargs
-            )
-            while True:
-                resp = s.get(url).json()
+            ))
 
-                if error := resp.get('error'):
-                    if 'maximum requests per minute' in error:
-                        time.sleep(65)
-                        continue
-                    break
+            results = resp.get('results')
+            if not results:
+                break
 
-                for item in resp['results']:
-                    symbols[item.pop('ticker')] = item
+            pages.append(cls.__resp_to_df(results))
+            if len(results) < cls.klines_limit:
+                break
 
-                url = resp.get('next_url')
-                if url is None:
-                    break
-                url += '&' + cls.API_KEY
+            cursor = pages[-1]['time'].iloc[-1].to_pydatetime() + timedelta(milliseconds=1)
 
-        return symbols
+        if not pages:
+            return cls.__resp_to_df([])
+        return concat(pages, ignore_index=True)
+
+    @classmethod
+    async def get_klines_async(
+            cls,
+            session: ClientSession,
+            symbol: str,
+            interval: int,
+            unit: str,
+            start: datetime,
+            end: datetime,
+            **kwargs: str
+    ) -> DataFrame:
+        """
+        Fetches the candles of a time range, all windows concurrently
+
+        :return: pandas DataFrame with the candles, sorted by time
+        """
+        return cls.__concat(await asyncio.gather(*[
+            cls.get_window_async(session, symbol, interval, unit, *window, **kwargs)
+            for window in cls.windows(start, end)
+        ]))
+
+    @classmethod
+    async def get_many_klines_async(
+            cls,
+            symbols: list[str],
+            interval: int,
+            unit: str,
+            start: datetime,
+            end: datetime,
+            **kwargs: str
+    ) -> dict[str, DataFrame]:
+        """
+        Fetches the candles of several symbols, all symbols and windows concurrently over one connection pool
+
+        :return: pandas DataFrames with the candles keyed by symbol
+        """
+        async with cls.session() as session:
+            klines = await asyncio.gather(*[
+                cls.get_klines_async(session, symbol, interval, unit, start, end, **kwargs) for symbol in symbols
+            ])
+
+        return dict(zip(symbols, klines))
+
+    @classmethod
+    def get_many_klines(
+            cls,
+            symbols: list[str],
+            interval: int,
+            unit: str,
+            start: datetime,
+            end: datetime,
+            **kwargs: str
+    ) -> dict[str, DataFrame]:
+        """
+        Fetches historical candlestick data for several symbols at once.
+
+        :param symbols: trading symbols
+        :param interval: interval for k_lines data
+        :param unit: unit of the interval
+        :param start: start date and time for the data request
+        :param end: end date and time for the data request
+        :return: pandas DataFrames with the k_lines data keyed by symbol
+        """
+        return cls._run(cls.get_many_klines_async(symbols, interval, unit, start, end, **kwargs))
 
     @classmethod
     def get_klines(
@@ -150,7 +370,7 @@ class PolygonAPI:
             start: datetime,
             end: datetime,
             **kwargs: str
-    ) -> None | DataFrame | dict:
+    ) -> DataFrame:
         """
         Fetches historical candlestick data for a given symbol and time range.
 
@@ -159,34 +379,55 @@ class PolygonAPI:
         :param unit: unit of the interval
         :param start: start date and time for the data request
         :param end: end date and time for the data request
-        :return: pandas DataFrame containing the k_lines data, or `None` if no data is retrieved
+        :return: pandas DataFrame containing the k_lines data
         """
+        return cls.get_many_klines([symbol], interval, unit, start, end, **kwargs)[symbol]
 
-        result = DataFrame()
-
-        with Session() as s:
-            while True:
-                resp = s.get(cls.get_candles_link(
-                    symbol=symbol,
-                    tf=cls.__timeframe_to_str(interval, unit),
-                    timeline=cls.__datetime_to_str(start, end),
-                    limit='50000',
-                    **kwargs
-                )).json()
-                resp = cls.__resp_to_df(resp.get('results'))
-
-                try:
-                    if resp['time'][resp.last_valid_index()] == start:
-                        break
-
-                    result = concat([result, resp], ignore_index=True)
-                    last = result['time'][result.last_valid_index()]
-
-                    if last >= end:
-                        break
-                    start = last
+    @classmethod
+    def iter_klines(
+            cls,
+            symbol: str,
+            interval: int,
+            unit: str,
+            start: datetime,
+            end: datetime,
+            **kwargs: str
+    ) -> Iterator[DataFrame]:
+        """
+        Streams historical candlestick data, fetching `connections` windows concurrently at a time
+            over one connection pool, kept open until the iterator is exhausted or closed
 
-                except Exception:
-                    break
+        :param symbol: trading symbol (e.g., 'BTCUSDT') for which to retrieve k_lines data.
+        :param interval: interval for k_lines data
+        :param unit: unit of the interval
+        :param start: start date and time for the data request
+        :param end: end date and time for the data request
+        :return: iterator of DataFrames with the k_lines data, in chronological order
+        """
+        windows = cls.windows(start, end)
+
+        async def open_session() -> ClientSession:
+            return cls.session()
+
+        async def run(session: ClientSession, group: list[tuple[datetime, datetime]]) -> DataFrame:
+            return cls.__concat(await asyncio.gather(*[
+                cls.get_window_async(session, symbol, interval, unit, *window, **kwargs) for window in group
+            ]))
+
+        loop = asyncio.new_event_loop()
+        try:
+            session = cls._run(open_session(), loop)
+            try:
+                for i in range(0, len(windows), cls.connections):
+                    yield cls._run(run(session, windows[i:i + cls.connections]), loop)
+            finally:
+                loop.run_until_complete(session.close())
+        finally:
+            loop.close()
 
-        return result
+    @classmethod
+    def __concat(cls, frames: list[DataFrame]) -> DataFrame:
+        frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            return cls.__resp_to_df([])
+        return concat(frames, ignore_index=True).drop_duplicates('time', ignore_index=True)
@@ -0,0 +1,59 @@
+import asyncio
+import time
+from threading import Lock
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter.
+
+    Tokens are refilled continuously at `rate` per second up to `capacity`; `acquire` blocks
+        until the requested amount is available, `acquire_async` awaits it without blocking the event loop.
+        With exchanges a token is a unit of request weight.
+    """
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = Lock()
+
+    def _take(self, tokens: float) -> float:
+        """
+        Takes the tokens if they are available
+
+        :return: 0 if the tokens were taken, otherwise the number of seconds to wait for them
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0
+            return (tokens - self.tokens) / self.rate
+
+    def acquire(self, tokens: float = 1):
+        """
+        Blocks until `tokens` are available and takes them
+
+        :param tokens: amount of tokens to take, capped by the capacity of the bucket
+        """
+        tokens = min(tokens, self.capacity)
+
+        while wait := self._take(tokens):
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: float = 1):
+        """
+        Waits until `tokens` are available and takes them, letting other coroutines run meanwhile
+
+        :param tokens: amount of tokens to take, capped by the capacity of the bucket
+        """
+        tokens = min(tokens, self.capacity)
+
+        while wait := self._take(tokens):
+            await asyncio.sleep(wait)
@@ -0,0 +1,124 @@
+import os
+from hashlib import blake2b
+from pathlib import Path
+
+from numpy import ndarray, ascontiguousarray, load, save
+from pandas import DataFrame
+
+from .indicators.registry import IndicatorRegistry, IndicatorSpec
+from config import DatabaseSettings
+
+SOURCE_COLUMNS = ['time', 'open', 'high', 'low', 'close', 'volume']
+
+
+class FeatureCache:
+    """
+    Local cache of indicator output columns in `.npy` files, one file per column:
+        `<root>/<SYMBOL>/<interval><unit>/<function>/<column>-<params hash>-<klines hash>.npy`
+
+    The params hash covers the inputs and keyword arguments of the indicator call, the klines hash the times
+        and prices the indicator ran on, so a column is reused only for the very same klines range.
+        Files are written atomically, so the cache can be shared by concurrent processes.
+    """
+
+    _default: 'FeatureCache | None' = None
+
+    def __init__(self, root: str | Path, registry: IndicatorRegistry | None = None):
+        self.root = Path(root)
+        self.registry = registry or IndicatorRegistry.default()
+
+    @classmethod
+    def default(cls):
+        """
+        Cache under `DatabaseSettings.FEATURES_PATH` with the default indicator registry, built once per process
+        """
+        if cls._default is None:
+            cls._default = cls(DatabaseSettings.FEATURES_PATH)
+        return cls._default
+
+    @staticmethod
+    def digest(*parts: bytes) -> str:
+        h = blake2b(digest_size=8)
+        for part in parts:
+            h.update(part)
+        return h.hexdigest()
+
+    @classmethod
+    def klines_digest(cls, klines: DataFrame) -> str:
+        """
+        Hash of the times and prices of the klines
+        """
+        return cls.digest(*[
+            ascontiguousarray(klines[column].to_numpy()).tobytes() for column in SOURCE_COLUMNS if column in klines
+        ])
+
+    @classmethod
+    def spec_digest(cls, spec: IndicatorSpec) -> str:
+        """
+        Hash of the inputs and keyword arguments of an indicator call
+        """
+        return cls.digest(repr((spec.inputs, spec.params)).encode())
+
+    def file(self, symbol: str, interval: int, unit: str, column: str, source: str) -> Path:
+        spec = self.registry.specs[column]
+        name = column.replace('/', '_').replace(os.sep, '_')
+        return self.root / symbol.upper() / f'{interval}{unit}' / spec.name / \
+            f'{name}-{self.spec_digest(spec)}-{source}.npy'
+
+    def get(self, file: Path, length: int) -> ndarray | None:
+        """
+        Reads a cached column memory-mapped, `None` when it is missing or unreadable
+        """
+        try:
+            values = load(file, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+
+        return values if len(values) == length else None
+
+    def put(self, file: Path, values: ndarray):
+        """
+        Writes a column atomically; failures are ignored, the column being computed again next time
+        """
+        tmp = file.with_name(f'{file.name}.{os.getpid()}.tmp')
+        try:
+            file.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp, 'wb') as f:
+                save(f, values)
+            os.replace(tmp, file)
+        except OSError:
+            pass
+
+    def compute(self, klines: DataFrame, columns, symbol: str, interval: int, unit: str) -> DataFrame:
+        """
+        Reads the requested columns from the cache and computes only the missing ones, caching them.
+            Columns which are not registered or could not be computed are left out, as in
+            `IndicatorRegistry.compute`.
+
+        :param klines: klines with 'time', 'open', 'high', 'low', 'close' and 'volume' columns
+        :param columns: output columns to compute
+        :param symbol: trading symbol of the klines
+        :param interval: time interval of the klines
+        :param unit: time unit of the klines
+        :return: DataFrame with the columns, in the requested order, aligned with `klines`
+        """
+        columns = [column for column in dict.fromkeys(columns) if column in self.registry]
+        source = self.klines_digest(klines)
+
+        outputs, missing = {}, []
+        for column in columns:
+            values = self.get(self.file(symbol, interval, unit, column, source), len(klines))
+            if values is None:
+                missing.append(column)
+            else:
+                outputs[column] = values
+
+        computed = self.registry.compute(klines, missing)
+        for column in computed.columns:
+            values = computed[column].to_numpy()
+            if not values.dtype.hasobject:
+                self.put(self.file(symbol, interval, unit, column, source), values)
+
+            outputs[column] = values
+
+        return DataFrame({column: outputs[column] for column in columns if column in outputs}, index=klines.index)
@@ -0,0 +1,86 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.util import Finalize
+from typing import Callable
+
+from pandas import DataFrame, Series
+
+from .registry import indicator_functions, indicator_inputs
+from utils import SharedArrays
+
+INPUT_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+_shared: SharedArrays | None = None
+_klines: DataFrame | None = None
+
+
+def run_indicator(function: Callable, klines: DataFrame, threshold: float) -> DataFrame | None:
+    """
+    Runs an indicator function with its default parameters
+
+    :param function: indicator function
+    :param klines: klines with 'open', 'high', 'low', 'close' and 'volume' columns
+    :param threshold: minimum number of non-null values of the kept output columns
+    :return: output columns with at least `threshold` non-null values, `None` when the indicator fails
+    """
+    try:
+        resp = function(*[klines[col] for col in indicator_inputs(function)])
+    except Exception:
+        return None
+
+    if isinstance(resp, Series):
+        resp = resp.to_frame()
+    elif not isinstance(resp, DataFrame):
+        return None
+
+    return resp[[col for col in resp.columns if resp[col].count() >= threshold]]
+
+
+def _init_worker(spec: dict):
+    """
+    Attaches the worker process to the shared klines, detaching it when the worker exits
+    """
+    global _shared, _klines
+
+    _shared = SharedArrays.attach(spec)
+    _klines = DataFrame({column: _shared[column] for column in spec}, copy=False)
+    Finalize(None, _close_worker, exitpriority=0)
+
+
+def _close_worker():
+    global _shared, _klines
+
+    # the views of the klines are released first, the blocks cannot be closed while they are in use
+    _klines = None
+    _shared.close()
+
+
+def _run_indicator(name: str, threshold: float) -> DataFrame | None:
+    return run_indicator(dict(indicator_functions())[name], _klines, threshold)
+
+
+def compute_indicators(klines: DataFrame, threshold: float, workers: int | None = None) -> list[DataFrame | None]:
+    """
+    Runs every indicator function with its default parameters, in a pool of `workers` processes reading
+        the klines from shared memory. The outputs have a range index.
+
+    :param klines: klines with 'open', 'high', 'low', 'close' and 'volume' columns
+    :param threshold: minimum number of non-null values of the kept output columns
+    :param workers: number of worker processes, defaults to the number of CPUs; 1 runs in this process
+    :return: outputs of the indicator functions in definition order, `None` for the failed ones
+    """
+    workers = workers or os.cpu_count()
+    functions = indicator_functions()
+
+    if workers <= 1:
+        klines = klines[INPUT_COLUMNS].reset_index(drop=True)
+        return [run_indicator(function, klines, threshold) for _, function in functions]
+
+    with SharedArrays.create(**{column: klines[column].to_numpy() for column in INPUT_COLUMNS}) as shared, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(shared.spec,)) as pool:
+        return list(pool.map(
+            _run_indicator,
+            [name for name, _ in functions],
+            [threshold] * len(functions),
+            chunksize=max(1, len(functions) // (workers * 4)),
+        ))
@@ -0,0 +1,175 @@
+from dataclasses import dataclass
+from inspect import signature
+from typing import Any, Callable
+
+from numpy import arange, cumsum, maximum, minimum, abs as np_abs
+from numpy.random import default_rng
+from pandas import DataFrame, Series, date_range, concat
+
+from . import base
+
+
+def indicator_inputs(function: Callable) -> list[str]:
+    """
+    Names of the kline columns an indicator function takes positionally,
+        e.g. `['high', 'low', 'close']` for `cci(high, low, close, length=None, ...)`
+    """
+    return [param.name.removesuffix('_') for param in signature(
+        function).parameters.values() if param.default and param.name != 'kwargs']
+
+
+def indicator_functions() -> list[tuple[str, Callable]]:
+    """
+    Every indicator function exported by `dataset.indicators.base`, in definition order
+    """
+    return [(name, func) for name, func in base.__dict__.items() if '__' not in name and callable(func)]
+
+
+@dataclass(frozen=True)
+class IndicatorSpec:
+    """
+    A call of an indicator function producing one or more output columns.
+
+    Attributes:
+        name: name of the indicator function
+        function: indicator function from `pandas_ta`
+        inputs: kline columns passed positionally
+        params: keyword arguments of the call, empty for the defaults
+    """
+    name: str
+    function: Callable
+    inputs: tuple[str, ...]
+    params: tuple[tuple[str, Any], ...] = ()
+
+    def __call__(self, klines: DataFrame) -> DataFrame | Series:
+        return self.function(*[klines[col] for col in self.inputs], **dict(self.params))
+
+
+class IndicatorRegistry:
+    """
+    Maps indicator output columns, such as 'RSI_14' or 'CCI_14_0.015', to the calls producing them,
+        so that only the requested columns are computed.
+    """
+
+    _default: 'IndicatorRegistry | None' = None
+
+    def __init__(self):
+        self.specs: dict[str, IndicatorSpec] = {}
+
+    @property
+    def columns(self) -> list[str]:
+        return list(self.specs)
+
+    def __contains__(self, column: str) -> bool:
+        return column in self.specs
+
+    def register(self, column: str, function: Callable, inputs=None, **params):
+        """
+        Registers the call producing `column`, e.g. `register('RSI_21', rsi, length=21)`
+
+        :param column: output column name
+        :param function: indicator function
+        :param inputs: kline columns passed positionally, detected from the signature by default
+        :param params: keyword arguments of the call
+        """
+        self.specs[column] = IndicatorSpec(
+            name=function.__name__,
+            function=function,
+            inputs=tuple(inputs or indicator_inputs(function)),
+            params=tuple(sorted(params.items())),
+        )
+
+    @staticmethod
+    def sample_klines(length: int = 2000, seed: int = 0) -> DataFrame:
+        """
+        Synthetic random walk klines used to discover the output columns of the indicators
+        """
+        rng = default_rng(seed)
+
+        close = 1000 + cumsum(rng.normal(0, 1, length))
+        open_ = close + rng.normal(0, .5, length)
+        spread = np_abs(rng.normal(0, 1, length))
+
+        return DataFrame({
+            'time': date_range('2020-01-01', periods=length, freq='1min'),
+            'open': open_,
+            'high': maximum(open_, close) + spread,
+            'low': minimum(open_, close) - spread,
+            'close': close,
+            'volume': 100 + rng.exponential(100, length) + arange(length) % 7,
+        })
+
+    @classmethod
+    def discover(cls, sample: DataFrame | None = None):
+        """
+        Runs every indicator function with its default parameters once on sample klines
+            and registers the columns it produces. Columns already produced by an earlier function are kept.
+
+        :param sample: klines to run the indicators on, synthetic ones by default
+        :return: registry of every discovered column
+        """
+        registry = cls()
+        sample = cls.sample_klines() if sample is None else sample
+
+        for name, function in indicator_functions():
+            spec = IndicatorSpec(name=name, function=function, inputs=tuple(indicator_inputs(function)))
+
+            try:
+                resp = spec(sample)
+            except Exception:
+                continue
+
+            if isinstance(resp, DataFrame):
+                outputs = resp.columns
+            elif isinstance(resp, Series):
+                outputs = [resp.name]
+            else:
+                continue
+
+            for column in outputs:
+                registry.specs.setdefault(column, spec)
+
+        return registry
+
+    @classmethod
+    def default(cls):
+        """
+        Registry discovered from the default parameters of every indicator, built once per process
+        """
+        if cls._default is None:
+            cls._default = cls.discover()
+        return cls._default
+
+    def compute(self, klines: DataFrame, columns) -> DataFrame:
+        """
+        Computes the requested columns, calling every indicator function only once.
+            Columns which are not registered or could not be computed are left out.
+
+        :param klines: klines with 'open', 'high', 'low', 'close' and 'volume' columns
+        :param columns: output columns to compute
+        :return: DataFrame with the computed columns, in the requested order, aligned with `klines`
+        """
+        requested: dict[IndicatorSpec, list[str]] = {}
+        for column in columns:
+            if column in self.specs:
+                requested.setdefault(self.specs[column], []).append(column)
+
+        outputs = {}
+        for spec, spec_columns in requested.items():
+            try:
+                resp = spec(klines)
+            except Exception:
+                continue
+
+            if isinstance(resp, Series):
+                resp = resp.to_frame()
+
+            for column in spec_columns:
+                if column in resp.columns:
+                    outputs[column] = resp[column]
+
+        columns = [column for column in columns if column in outputs]
+        if not columns:
+            return DataFrame(index=klines.index)
+
+        return concat([outputs[column] for column in columns], axis=1, keys=columns)
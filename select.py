@@ -1,61 +1,212 @@
+import sys
 from random import uniform, getrandbits
 
 import tester
 import json
+from typing import Iterable, Iterator
 
+from pandas import DataFrame, concat
+
+from backtest import (
+    FeatureMatrix, SearchSpace, STRATEGIES, parallel_search, matrix_objective, sweep_thresholds, validate, fold_summary
+)
+from backtest.strategies import Objective, filter_set_key
+from config import DatabaseSettings
+from database import Database
 from utils import TimeFrame
 
+SYMBOL = 'ETHUSDT'
+TIMEFRAME = TimeFrame(1, 'm')
+TRADES = 'TradesList-ETH11-min.csv'
+
 
 def load_filters() -> dict[str, list[int]]:
     with open('filters.json') as f:
         res = json.load(f)
     return res
 
-def main():
-    Symbol = 'ETHUSDT'
 
-    trades = tester.read_trades_from_csv('TradesList-ETH11-min.csv')
-    start_date, end_date = tester.get_date_range(trades)
-    dataset = tester.fetch_market_data(Symbol, TimeFrame(1, 'm'), start_date, end_date)
+def random_filter_set(filters: dict[str, list[int]]) -> dict[str, list[list[str | float]]]:
+    temp = {'long': [], 'short': []}
+    used_filters = set()
 
-    filters = load_filters()
-    params: list[dict[str, list[list[str | float]] | float]] = []
+    for filt, rng in filters.items():
+        base_filt = filt.split('_')[0]
+        if base_filt in used_filters:
+            continue
 
-    for _ in range(10):
-        temp = {'long': [], 'short': []}
-        used_filters = set()
+        rand_val = uniform(0, 100)
+        sign = '<' if getrandbits(1) else '>'
+        value = uniform(rng[0], rng[1])
+
+        if rand_val > 5:
+            temp['long'].append([filt, sign, value])
+        elif rand_val < 5:
+            temp['short'].append([filt, sign, value])
+        elif 47 < rand_val < 53:
+            opposite_sign = '>' if sign == '<' else '<'
+            temp['long'].append([filt, sign, value])
+            temp['short'].append([filt, opposite_sign, value])
+        else:
+            continue
 
-        for filt, rng in filters.items():
-            base_filt = filt.split('_')[0]
-            if base_filt in used_filters:
-                continue
+        used_filters.add(base_filt)
+
+    return temp
 
-            rand_val = uniform(0, 100)
-            sign = '<' if getrandbits(1) else '>'
-            value = uniform(rng[0], rng[1])
-
-            if rand_val > 5:
-                temp['long'].append([filt, sign, value])
-            elif rand_val < 5:
-                temp['short'].append([filt, sign, value])
-            elif 47 < rand_val < 53:
-                opposite_sign = '>' if sign == '<' else '<'
-                temp['long'].append([filt, sign, value])
-                temp['short'].append([filt, opposite_sign, value])
-            else:
-                continue
 
-            used_filters.add(base_filt)
+def search(matrix: FeatureMatrix, candidates: list[dict], top: int) -> list[dict]:
+    pnl, counts = matrix.evaluate(candidates)
 
-        filtered_trades = tester.apply_filters(trades, dataset, temp['long'], temp['short'])
-        if not filtered_trades:
+    params: list[dict[str, list[list[str | float]] | float]] = []
+    for temp, res, count in zip(candidates, pnl, counts):
+        if not count:
             continue
 
-        temp['res'] = sum(float(trade['profit_or_loss']) for trade in filtered_trades)
+        temp['res'] = float(res)
         params.append(temp)
+
+    params.sort(key=lambda temp: temp['res'], reverse=True)
+    return params[:top]
+
+
+def load_matrix() -> tuple[FeatureMatrix, dict[str, list[int]]]:
+    trades = tester.load_trades(TRADES)
+    start_date, end_date = tester.get_date_range(trades)
+
+    filters = load_filters()
+    dataset = tester.fetch_market_data(SYMBOL, TIMEFRAME, start_date, end_date, columns=list(filters))
+    matrix = FeatureMatrix.build(trades, dataset, filters)
+    filters = {filt: rng for filt, rng in filters.items() if filt in matrix.column_index}
+
+    return matrix, filters
+
+
+class ResultWriter:
+    """
+    Stores every evaluated filter set of a search run with its metrics, `batch_size` filter sets at a time.
+        Filter sets already stored for the symbol and timeframe, by this run or a previous one, are skipped.
+    """
+
+    def __init__(self, matrix: FeatureMatrix, strategy: str, batch_size: int = 10_000, **run_params):
+        self.matrix = matrix
+        self.batch_size = batch_size
+
+        self.known = Database.get_filter_set_keys(SYMBOL, TIMEFRAME)
+        self.run_id = Database.add_backtest_run(SYMBOL, TIMEFRAME, trades=TRADES, strategy=strategy, params=run_params)
+
+        self.pending: list[dict] = []
+        self.stored = 0
+
+    def record(self, candidates: Iterable[dict]) -> Iterator[dict]:
+        """
+        Queues the candidates for storage, leaving out the known ones so they are not evaluated again
+        """
+        for temp in candidates:
+            key = json.dumps(filter_set_key(temp))
+            if key in self.known:
+                continue
+
+            self.known.add(key)
+            self.pending.append({'key': key, 'long': temp['long'], 'short': temp['short']})
+            if len(self.pending) >= self.batch_size:
+                self.flush()
+
+            yield temp
+
+    def objective(self, objective: Objective) -> Objective:
+        """
+        Wraps the objective of a search strategy to store every filter set it scores
+        """
+
+        def recorded(filter_sets: list[dict]):
+            for _ in self.record(filter_sets):
+                pass
+            return objective(filter_sets)
+
+        return recorded
+
+    def flush(self):
+        if not self.pending:
+            return
+
+        results = concat(
+            [DataFrame(self.pending, columns=['key', 'long', 'short']), self.matrix.metrics(self.pending)], axis=1
+        )
+        self.stored += Database.add_filter_set_results(self.run_id, results, self.batch_size)
+        self.pending = []
+
+
+def main(
+        iterations: int = 100_000,
+        top: int = 10,
+        workers: int = 1,
+        chunk_size: int = 10_000,
+        strategy: str | None = None,
+        patience: int | None = None,
+):
+    matrix, filters = load_matrix()
+
+    writer = ResultWriter(
+        matrix, strategy or 'random', iterations=iterations, top=top, patience=patience
+    ) if DatabaseSettings.ENABLED else None
+
+    if strategy is not None:
+        space = SearchSpace.from_matrix(matrix, filters)
+        optimizer = STRATEGIES[strategy](space, budget=iterations, patience=patience, top_k=top)
+        objective = matrix_objective(matrix)
+        params = optimizer.search(objective if writer is None else writer.objective(objective))
+    else:
+        candidates = (random_filter_set(filters) for _ in range(iterations))
+        if writer is not None:
+            candidates = writer.record(candidates)
+
+        if workers > 1:
+            params = parallel_search(matrix, candidates, top_k=top, workers=workers, chunk_size=chunk_size)
+        else:
+            params = search(matrix, list(candidates), top)
+
     print(params)
+    if writer is not None:
+        writer.flush()
+
+
+def sweep():
+    matrix, filters = load_matrix()
+
+    best, curves = sweep_thresholds(matrix, filters)
+    print(best.to_string())
+
+    return best, curves
+
+
+def validation(k: int = 5, iterations: int = 10_000, top: int = 10, strategy: str = 'random', workers: int = 0):
+    matrix, _ = load_matrix()
+
+    results = validate(
+        tester.load_trades(TRADES), matrix, k=k, strategy=strategy, workers=workers or None, budget=iterations, top_k=top
+    )
+    print(fold_summary(results).to_string())
+
+    return results
+
+
+def best(top: int = 10):
+    if not DatabaseSettings.ENABLED:
+        return None
+
+    results = Database.get_top_filter_sets(SYMBOL, TIMEFRAME, top=top)
+    print(results.to_string())
 
+    return results
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    if sys.argv[1:] == ['sweep']:
+        sweep()
+    elif sys.argv[1:] == ['validate']:
+        validation()
+    elif sys.argv[1:] == ['best']:
+        best()
+    else:
+        main()
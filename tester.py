@@ -1,8 +1,22 @@
 import csv
-from datetime import datetime, timedelta
+import os
+from datetime import timedelta
+from pathlib import Path
 
+from numpy import ndarray, flatnonzero, where, less, greater, ones, full, float64
+from pandas import DataFrame, Categorical, Index, read_csv, to_datetime
+
+from backtest.metrics import side_metrics
 from dataset import Dataset
-from utils import TimeFrame
+from utils import Side, TimeFrame
+
+try:
+    from pyarrow import feather
+except ImportError:
+    feather = None
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+TRADE_COLUMNS = ['opened_at', 'closed_at', 'side', 'profit_or_loss']
 
 
 def read_trades_from_csv(csv_file):
@@ -14,89 +28,187 @@ def read_trades_from_csv(csv_file):
     return trades
 
 
+def parse_trades(trades: DataFrame) -> DataFrame:
+    """
+    Converts the string columns of raw trades into typed ones: datetime64 'opened_at' and 'closed_at',
+        categorical upper-case 'side' and float 'profit_or_loss'. Other columns are kept as they are.
+
+    :param trades: trades with the columns of the trades CSV file as strings
+    :return: typed trades
+    """
+    trades = trades.copy()
+
+    trades['opened_at'] = to_datetime(trades['opened_at'], format=TIME_FORMAT)
+    trades['closed_at'] = to_datetime(trades['closed_at'], format=TIME_FORMAT)
+    trades['side'] = Categorical(trades['side'].str.upper(), categories=[side.value for side in Side])
+    trades['profit_or_loss'] = trades['profit_or_loss'].astype(float64)
+
+    return trades
+
+
+def load_trades(csv_file, cache: bool = True) -> DataFrame:
+    """
+    Reads a trades CSV file into typed columns, see `parse_trades`.
+
+    The parsed trades are cached in an uncompressed Arrow sidecar file next to the CSV file, `<csv_file>.arrow`,
+        which is used for as long as it is newer than the CSV file.
+
+    :param csv_file: path of the trades CSV file
+    :param cache: read and write the sidecar file; requires `pyarrow`
+    :return: typed trades in the order of the file
+    """
+    csv_file = Path(csv_file)
+    sidecar = csv_file.with_name(csv_file.name + '.arrow')
+    cache = cache and feather is not None
+
+    if cache and sidecar.exists() and sidecar.stat().st_mtime_ns >= csv_file.stat().st_mtime_ns:
+        return feather.read_feather(sidecar, memory_map=True)
+
+    trades = parse_trades(read_csv(csv_file, dtype=str, keep_default_na=False))
+
+    if cache:
+        tmp = sidecar.with_name(f'{sidecar.name}.{os.getpid()}.tmp')
+        try:
+            feather.write_feather(trades, tmp, compression='uncompressed')
+            os.replace(tmp, sidecar)
+        except OSError:
+            pass
+
+    return trades
+
+
+def as_trades(trades) -> DataFrame:
+    """
+    Typed trades, either as given or parsed from a list of trades as read by `read_trades_from_csv`
+    """
+    if isinstance(trades, DataFrame):
+        return trades
+    return parse_trades(DataFrame(list(trades), columns=None if trades else TRADE_COLUMNS))
+
+
 def get_date_range(trades):
-    opened_at_times = [datetime.strptime(trade['opened_at'], '%Y-%m-%d %H:%M:%S').date() for trade in trades]
-    closed_at_times = [datetime.strptime(trade['closed_at'], '%Y-%m-%d %H:%M:%S').date() for trade in trades]
+    trades = as_trades(trades)
 
-    min_date = min(opened_at_times)
-    max_date = max(closed_at_times)
+    min_date = trades['opened_at'].min().normalize()
+    max_date = trades['closed_at'].max().normalize()
 
-    return datetime.combine(min_date, datetime.min.time()), datetime.combine(max_date, datetime.min.time()) + timedelta(days=1)
+    return min_date.to_pydatetime(), max_date.to_pydatetime() + timedelta(days=1)
 
 
-def fetch_market_data(symbol, timeframe, start, end):
-    return Dataset.make(symbol=symbol, timeframe=timeframe, start=start, end=end)
+def fetch_market_data(symbol, timeframe, start, end, columns=None):
+    return Dataset.make(symbol=symbol, timeframe=timeframe, start=start, end=end, columns=columns)
 
 
-def apply_filters(trades, dataset, long_filters=(('RSI_14', '<', 30), ('CCI_14_0.015', '<', -100)), short_filters=(('RSI_14', '>', 70), ('CCI_14_0.015', '>', 100))):
-    filtered_trades = []
+OPERATORS = {'<': less, '>': greater}
 
-    for trade in trades:
-        opened_at = datetime.strptime(trade['opened_at'], '%Y-%m-%d %H:%M:%S') - timedelta(minutes=1)
 
-        matching_row = dataset.content.loc[dataset.content['time'] == opened_at]
+def match_candles(trades, content: DataFrame, candle: timedelta = timedelta(minutes=1)) -> ndarray:
+    """
+    Aligns every trade with the last candle closed when it was opened, so no trade sees a candle still open.
+        On 1m candles this is the candle opened one minute before the trade.
 
-        if matching_row.empty:
-            continue
+    :param trades: trades as loaded by `load_trades` or read by `read_trades_from_csv`
+    :param content: candles with a 'time' column, in chronological order
+    :param candle: duration of the candles, see `TimeFrame.timedelta`
+    :return: positional index of the matching candle for every trade, -1 when no candle closed within
+        one candle duration before the trade or when the trade was not opened on a whole minute
+    """
+    opened_at = Index(as_trades(trades)['opened_at'])
 
-        side = trade['side'].upper()
-        valid_trade = True
-        filters = long_filters if side == 'LONG' else short_filters
+    times = Index(content['time'])
+    first = ~times.duplicated()
+    rows = flatnonzero(first)
 
-        for filter_condition in filters:
-            column, operator, value = filter_condition
-            if operator == '<':
-                if not (matching_row[column].values[0] < value):
-                    valid_trade = False
-                    break
-            elif operator == '>':
-                if not (matching_row[column].values[0] > value):
-                    valid_trade = False
-                    break
-            else:
-                raise ValueError(f"Unsupported operator: {operator}")
+    if not len(rows):
+        return full(len(opened_at), -1)
 
-        if valid_trade:
-            filtered_trades.append(trade)
+    closed_at = times[first] + candle
+    positions = closed_at.searchsorted(opened_at, side='right') - 1
+    found = (positions >= 0) & (opened_at - closed_at[positions.clip(0)] < candle)
+    # trades opened between two minutes are left unmatched, as by the exact lookup of their 1m candle
+    found &= opened_at == opened_at.floor('min')
 
-    return filtered_trades
+    return where(found, rows[positions.clip(0)], -1)
 
 
-def calculate_statistics(filtered_trades):
-    long_trades = [trade for trade in filtered_trades if trade['side'].upper() == 'LONG']
-    short_trades = [trade for trade in filtered_trades if trade['side'].upper() == 'SHORT']
+def conditions_mask(content: DataFrame, rows: ndarray, conditions) -> ndarray:
+    """
+    Evaluates `(column, operator, value)` conditions for the given candle rows
 
-    def print_trade_stats(trades, label):
-        if not trades:
-            print(f"{label} - No trades to calculate statistics.")
-            return
+    :param content: candles with indicator columns
+    :param rows: positional indexes of the candles to check
+    :param conditions: iterable of `(column, operator, value)`, where operator is '<' or '>'
+    :return: boolean mask which is `True` where every condition holds
+    """
+    mask = ones(len(rows), dtype=bool)
 
-        total_trades = len(trades)
-        wins = sum(float(trade['profit_or_loss']) > 0 for trade in trades)
-        winrate = (wins / total_trades) * 100
+    for column, operator, value in conditions:
+        if operator not in OPERATORS:
+            raise ValueError(f"Unsupported operator: {operator}")
+        mask &= OPERATORS[operator](content[column].to_numpy()[rows], value)
 
-        pnl = sum(float(trade['profit_or_loss']) for trade in trades)
+    return mask
 
-        max_up = max(float(trade['profit_or_loss']) for trade in trades) if trades else 0
-        max_drawdown = min(float(trade['profit_or_loss']) for trade in trades) if trades else 0
 
-        print(f"{label}:")
-        print(f"  Total Trades: {total_trades}")
-        print(f"  Winrate: {winrate:.2f}%")
-        print(f"  Total PnL: {pnl:.2f}")
-        print(f"  Max Up: {max_up:.2f}")
-        print(f"  Max Drawdown: {max_drawdown:.2f}\n")
+def apply_filters(trades, dataset, long_filters=(('RSI_14', '<', 30), ('CCI_14_0.015', '<', -100)), short_filters=(('RSI_14', '>', 70), ('CCI_14_0.015', '>', 100))):
+    frame = as_trades(trades)
+    if frame.empty:
+        return trades if isinstance(trades, DataFrame) else []
+
+    rows = match_candles(frame, dataset.content, (dataset.timeframe or Dataset.base_timeframe).timedelta)
+    found = rows >= 0
+    rows = rows[found]
+
+    is_long = (frame['side'] == Side.LONG.value).to_numpy()[found]
+
+    valid = ones(len(rows), dtype=bool)
+    valid[is_long] = conditions_mask(dataset.content, rows[is_long], long_filters)
+    valid[~is_long] = conditions_mask(dataset.content, rows[~is_long], short_filters)
 
-    print_trade_stats(filtered_trades, "Total Trades")
-    print_trade_stats(long_trades, "Long Trades")
-    print_trade_stats(short_trades, "Short Trades")
+    selected = flatnonzero(found)[valid]
+    if isinstance(trades, DataFrame):
+        return trades.iloc[selected]
+    return [trades[index] for index in selected]
+
+
+def calculate_statistics(filtered_trades):
+    """
+    Prints and returns the statistics of all, long and short trades, see `backtest.metrics.mask_metrics`
+
+    :param filtered_trades: trades as loaded by `load_trades` or read by `read_trades_from_csv`
+    :return: DataFrame of metrics indexed by 'total', 'long' and 'short'
+    """
+    statistics = side_metrics(as_trades(filtered_trades))
+
+    def print_trade_stats(stats, label):
+        if not stats['trades']:
+            print(f"{label} - No trades to calculate statistics.")
+            return
+
+        print(f"{label}:")
+        print(f"  Total Trades: {int(stats['trades'])}")
+        print(f"  Winrate: {stats['winrate'] * 100:.2f}%")
+        print(f"  Total PnL: {stats['pnl']:.2f}")
+        print(f"  Max Up: {stats['max_up']:.2f}")
+        print(f"  Worst Trade: {stats['worst']:.2f}")
+        print(f"  Max Drawdown: {stats['max_drawdown']:.2f}")
+        print(f"  Profit Factor: {stats['profit_factor']:.2f}")
+        print(f"  Sharpe: {stats['sharpe']:.2f}")
+        print(f"  Sortino: {stats['sortino']:.2f}")
+        print(f"  Expectancy: {stats['expectancy']:.2f}\n")
+
+    print_trade_stats(statistics.loc['total'], "Total Trades")
+    print_trade_stats(statistics.loc['long'], "Long Trades")
+    print_trade_stats(statistics.loc['short'], "Short Trades")
+
+    return statistics
 
 if __name__ == '__main__':
     Symbol = 'ETHUSDT'
 
-    trades = read_trades_from_csv('TradesList-ETH11-min.csv')
+    trades = load_trades('TradesList-ETH11-min.csv')
     start_date, end_date = get_date_range(trades)
-    dataset = fetch_market_data(Symbol, TimeFrame(1, 'm'), start_date, end_date)
+    dataset = fetch_market_data(Symbol, TimeFrame(1, 'm'), start_date, end_date, columns=['RSI_14', 'CCI_14_0.015'])
 
     filtered_trades = apply_filters(trades, dataset)
     calculate_statistics(filtered_trades)
@@ -0,0 +1,16 @@
+"""
+Run with `pytest tests` from the repository root. `python -m pytest` puts the root first on the path,
+    where `select.py` shadows the standard library module.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# klines and features go to temporary directories, the database is not needed
+_storage = tempfile.mkdtemp(prefix='klines-tests-')
+os.environ.setdefault('klines_storage', 'columnar')
+os.environ.setdefault('klines_path', os.path.join(_storage, 'klines'))
+os.environ.setdefault('features_path', os.path.join(_storage, 'features'))
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
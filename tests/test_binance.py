@@ -0,0 +1,120 @@
+from datetime import datetime, timedelta
+from math import ceil
+from threading import Lock
+
+import pytest
+
+pytest.importorskip('pandas_ta')
+pytest.importorskip('binance')
+
+from dataset.apis import BinanceAPI
+
+
+class FakeClient:
+    """
+    Serves klines on a regular grid like `Client.get_historical_klines`, recording every call
+        and the request weight the real client would spend on it
+    """
+
+    def __init__(self, interval: timedelta, failures: int = 0, overlap_after: datetime | None = None):
+        self.step = int(interval.total_seconds() * 1000)
+        self.failures = failures
+        self.overlap_after = None if overlap_after is None else int(overlap_after.timestamp() * 1000)
+
+        self.calls, self.weights = [], []
+        self.lock = Lock()
+
+    def get_historical_klines(self, symbol: str, interval: str, start_str: int, end_str: int):
+        with self.lock:
+            if self.failures:
+                self.failures -= 1
+                raise ConnectionError("exchange unavailable")
+            self.calls.append((start_str, end_str))
+
+        first = -(-start_str // self.step) * self.step
+        if self.overlap_after is not None and start_str > self.overlap_after:
+            # the last candle of the previous window comes again
+            first -= self.step
+        klines = [[ms, '1', '2', '0.5', '1.5', '10', ms + self.step - 1] for ms in range(first, end_str + 1, self.step)]
+
+        with self.lock:
+            self.weights.append(max(ceil(len(klines) / BinanceAPI.klines_per_request), 1) * BinanceAPI.klines_weight)
+        return klines
+
+
+class RecordingLimiter:
+    def __init__(self):
+        self.acquired = []
+        self.lock = Lock()
+
+    def acquire(self, tokens: float = 1):
+        with self.lock:
+            self.acquired.append(tokens)
+
+
+def fetch(monkeypatch, client: FakeClient, interval: int, unit: str, start: datetime, end: datetime, **kwargs):
+    monkeypatch.setattr(BinanceAPI, 'client', client)
+    return list(BinanceAPI.iter_klines(
+        'BTCUSDT', interval, unit, start, end, retry_sleep_time=0, sleep_time=0, **kwargs))
+
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_iter_klines_streams_every_window_once(monkeypatch, workers):
+    start, end = datetime(2024, 1, 1), datetime(2024, 2, 10)
+    client = FakeClient(timedelta(hours=1), overlap_after=start)
+
+    chunks = fetch(monkeypatch, client, 1, 'h', start, end, workers=workers)
+
+    windows = BinanceAPI.windows(start, end)
+    assert len(chunks) == len(windows) == 3
+    assert sorted(client.calls) == [
+        (int(window_start.timestamp() * 1000), int(window_end.timestamp() * 1000) - 1)
+        for window_start, window_end in windows
+    ]
+
+    times = [time for chunk in chunks for time in chunk['time']]
+    step = int(timedelta(hours=1).total_seconds())
+    assert times == [
+        datetime.fromtimestamp(seconds)
+        for seconds in range(int(start.timestamp()), int(end.timestamp()), step)
+    ]
+
+
+def test_limiter_is_charged_at_least_the_weight_spent(monkeypatch):
+    start, end = datetime(2024, 1, 1), datetime(2024, 1, 20)
+    client, limiter = FakeClient(timedelta(minutes=1)), RecordingLimiter()
+    monkeypatch.setattr(BinanceAPI, 'limiter', limiter)
+
+    fetch(monkeypatch, client, 1, 'm', start, end, workers=2)
+
+    expected = [BinanceAPI.window_weight(*window, 1, 'm') for window in BinanceAPI.windows(start, end)]
+    assert sorted(limiter.acquired) == sorted(expected)
+    assert sum(limiter.acquired) >= sum(client.weights)
+
+
+def test_single_worker_does_not_use_the_limiter(monkeypatch):
+    limiter = RecordingLimiter()
+    monkeypatch.setattr(BinanceAPI, 'limiter', limiter)
+
+    fetch(monkeypatch, FakeClient(timedelta(hours=1)), 1, 'h', datetime(2024, 1, 1), datetime(2024, 1, 2))
+
+    assert limiter.acquired == []
+
+
+def test_failed_requests_are_retried(monkeypatch):
+    client = FakeClient(timedelta(hours=1), failures=2)
+
+    chunks = fetch(monkeypatch, client, 1, 'h', datetime(2024, 1, 1), datetime(2024, 1, 2), retries=3)
+
+    assert len(chunks[0]) == 24
+    assert len(client.calls) == 1
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_exhausted_retries_raise(monkeypatch, workers):
+    client = FakeClient(timedelta(hours=1), failures=10)
+
+    with pytest.raises(ConnectionError):
+        fetch(monkeypatch, client, 1, 'h', datetime(2024, 1, 1), datetime(2024, 2, 1), retries=3, workers=workers)
+
+    assert client.calls == []
@@ -0,0 +1,111 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+from pandas import DataFrame, date_range
+from pandas.testing import assert_frame_equal
+
+pytest.importorskip('pyarrow')
+
+from database.columnar import ColumnarStorage
+
+SYMBOL, INTERVAL, UNIT = 'BTCUSDT', 1, 'h'
+
+
+def random_klines(start: str = '2024-01-20', periods: int = 24 * 40, seed: int = 0) -> DataFrame:
+    rng = np.random.default_rng(seed)
+    return DataFrame({
+        'time': date_range(start, periods=periods, freq='1h'),
+        'open': rng.normal(100, 1, periods),
+        'close': rng.normal(100, 1, periods),
+        'RSI_14': rng.uniform(0, 100, periods),
+    })
+
+
+def stored(storage: ColumnarStorage, **kwargs) -> DataFrame:
+    return storage.get_klines(SYMBOL, INTERVAL, UNIT, **kwargs)
+
+
+def files(storage: ColumnarStorage) -> list[str]:
+    return sorted(path.name for path in storage.klines_dir(SYMBOL, INTERVAL, UNIT).glob('*.arrow'))
+
+
+def test_chunked_klines_read_back_as_written(tmp_path):
+    storage, klines = ColumnarStorage(tmp_path), random_klines()
+
+    for start in range(0, len(klines), 100):
+        storage.add_klines(klines.iloc[start:start + 100], SYMBOL, INTERVAL, UNIT)
+
+    assert any(name.endswith('.part.arrow') for name in files(storage))
+    assert_frame_equal(stored(storage), klines)
+
+
+def test_later_klines_replace_stored_ones(tmp_path):
+    storage, klines = ColumnarStorage(tmp_path), random_klines()
+    storage.add_klines(klines, SYMBOL, INTERVAL, UNIT)
+
+    update = klines.iloc[500:600].assign(close=-1.)
+    storage.add_klines(update, SYMBOL, INTERVAL, UNIT)
+
+    expected = klines.copy()
+    expected.loc[500:599, 'close'] = -1.
+    assert_frame_equal(stored(storage), expected)
+
+
+def test_part_with_fewer_columns_keeps_the_stored_values(tmp_path):
+    storage, klines = ColumnarStorage(tmp_path), random_klines()
+    storage.add_klines(klines, SYMBOL, INTERVAL, UNIT)
+
+    update = klines.iloc[100:200][['time', 'RSI_14']].assign(RSI_14=50.)
+    storage.add_klines(update, SYMBOL, INTERVAL, UNIT)
+
+    expected = klines.copy()
+    expected.loc[100:199, 'RSI_14'] = 50.
+    assert_frame_equal(stored(storage), expected)
+    assert_frame_equal(stored(storage, columns=['RSI_14']), expected[['time', 'RSI_14']])
+
+
+def test_compact_leaves_month_files_with_the_same_klines(tmp_path):
+    storage, klines = ColumnarStorage(tmp_path), random_klines()
+    for start in range(0, len(klines), 50):
+        storage.add_klines(klines.iloc[start:start + 50], SYMBOL, INTERVAL, UNIT)
+    before = stored(storage)
+
+    storage.compact(SYMBOL, INTERVAL, UNIT)
+
+    assert files(storage) == ['2024-01.arrow', '2024-02.arrow']
+    assert_frame_equal(stored(storage), before)
+
+
+def test_parts_are_merged_once_there_are_max_parts(tmp_path, monkeypatch):
+    monkeypatch.setattr(ColumnarStorage, 'max_parts', 4)
+    storage, klines = ColumnarStorage(tmp_path), random_klines('2024-03-01', periods=24 * 10)
+
+    for start in range(0, len(klines), 24):
+        storage.add_klines(klines.iloc[start:start + 24], SYMBOL, INTERVAL, UNIT)
+        assert len(files(storage)) <= ColumnarStorage.max_parts
+
+    assert_frame_equal(stored(storage), klines)
+
+
+def test_time_range_reads_only_the_requested_klines(tmp_path):
+    storage, klines = ColumnarStorage(tmp_path), random_klines()
+    storage.add_klines(klines, SYMBOL, INTERVAL, UNIT)
+    start, end = datetime(2024, 1, 30, 5), datetime(2024, 2, 3)
+
+    expected = klines[(klines['time'] >= start) & (klines['time'] < end)].reset_index(drop=True)
+    assert_frame_equal(stored(storage, start=start, end=end), expected)
+    assert stored(storage, start=datetime(2025, 1, 1)).empty
+
+
+def test_klines_range_and_empty_storage(tmp_path):
+    storage, klines = ColumnarStorage(tmp_path), random_klines()
+
+    assert stored(storage) is None
+    assert storage.get_klines_range(SYMBOL, INTERVAL, UNIT) is None
+
+    storage.add_klines(klines.iloc[::-1], SYMBOL, INTERVAL, UNIT)
+    storage.add_klines(klines.iloc[:10], SYMBOL, INTERVAL, UNIT)
+
+    assert storage.get_klines_range(SYMBOL, INTERVAL, UNIT) == (
+        klines['time'].iloc[0].to_pydatetime(), klines['time'].iloc[-1].to_pydatetime())
@@ -0,0 +1,86 @@
+from datetime import timedelta
+
+import numpy as np
+import pytest
+from pandas import DataFrame, date_range
+
+pytest.importorskip('pandas_ta')
+pytest.importorskip('binance')
+
+import tester
+from backtest import FeatureMatrix
+from dataset import Dataset
+from utils import TimeFrame
+
+COLUMNS = ['RSI_14', 'CCI_14_0.015', 'ADX_14']
+
+
+def random_dataset(n: int = 3000, seed: int = 0) -> Dataset:
+    rng = np.random.default_rng(seed)
+    content = DataFrame({
+        'time': date_range('2024-01-01', periods=n, freq='1min'),
+        'open': 1., 'high': 1., 'low': 1., 'close': 1.,
+        'RSI_14': rng.uniform(0, 100, n),
+        'CCI_14_0.015': rng.normal(0, 100, n),
+        'ADX_14': np.where(rng.random(n) < .1, np.nan, rng.uniform(0, 60, n)),
+    })
+    return Dataset('test', content, timeframe=TimeFrame(1, 'm'))
+
+
+def random_trades(n: int = 1000, seed: int = 1) -> list[dict]:
+    rng = np.random.default_rng(seed)
+    # some trades open before or after the candles or between two minutes, those are never matched
+    opened_at = date_range('2024-01-01', periods=1, freq='1min')[0] + \
+        np.sort(rng.integers(-100, 3100, n)) * timedelta(minutes=1) + (rng.random(n) < .05) * timedelta(seconds=30)
+
+    return [
+        {
+            'opened_at': f'{time:%Y-%m-%d %H:%M:%S}',
+            'closed_at': f'{time + timedelta(hours=1):%Y-%m-%d %H:%M:%S}',
+            'side': side,
+            'profit_or_loss': str(pnl),
+        }
+        for time, side, pnl in zip(opened_at, rng.choice(['LONG', 'SHORT'], n), rng.normal(0, 1, n).round(6))
+    ]
+
+
+def random_filter_sets(count: int, seed: int = 2) -> list[dict]:
+    rng = np.random.default_rng(seed)
+    ranges = {'RSI_14': (0, 100), 'CCI_14_0.015': (-200, 200), 'ADX_14': (0, 60)}
+
+    def conditions():
+        columns = rng.choice(COLUMNS, rng.integers(0, 3), replace=False)
+        return [[str(column), str(rng.choice(['<', '>'])), float(rng.uniform(*ranges[column]))] for column in columns]
+
+    return [{'long': conditions(), 'short': conditions()} for _ in range(count)]
+
+
+def test_evaluate_matches_apply_filters():
+    dataset, trades = random_dataset(), random_trades()
+    matrix = FeatureMatrix.build(trades, dataset, COLUMNS)
+    filter_sets = random_filter_sets(200)
+
+    pnl, counts = matrix.evaluate(filter_sets, chunk_size=16)
+
+    for filter_set, set_pnl, count in zip(filter_sets, pnl, counts):
+        filtered = tester.apply_filters(trades, dataset, filter_set['long'], filter_set['short'])
+
+        assert count == len(filtered)
+        assert set_pnl == pytest.approx(sum(float(trade['profit_or_loss']) for trade in filtered), abs=1e-9)
+
+
+def test_metrics_match_the_statistics_of_the_filtered_trades():
+    dataset, trades = random_dataset(), random_trades()
+    matrix = FeatureMatrix.build(trades, dataset, COLUMNS)
+    filter_sets = random_filter_sets(20)
+
+    # the trades are in chronological order, so the drawdowns match too
+    metrics = matrix.metrics(filter_sets, chunk_size=8)
+
+    for filter_set, (_, row) in zip(filter_sets, metrics.iterrows()):
+        filtered = tester.apply_filters(trades, dataset, filter_set['long'], filter_set['short'])
+        expected = tester.calculate_statistics(filtered).loc['total']
+
+        assert row['trades'] == expected['trades']
+        assert row['pnl'] == pytest.approx(expected['pnl'], abs=1e-9)
+        assert row['max_drawdown'] == pytest.approx(expected['max_drawdown'], abs=1e-9, nan_ok=True)
@@ -0,0 +1,114 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip('pandas_ta')
+pytest.importorskip('binance')
+pytest.importorskip('aiohttp')
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from dataset.apis import PolygonAPI
+from dataset.apis.ratelimit import TokenBucket
+
+MINUTE = 60_000
+
+
+class FakePolygon:
+    """
+    Serves minute aggregates like the Polygon API, answering the first `failures` requests with `status`
+    """
+
+    def __init__(self, failures: int = 0, status: int = 429, body: str = '{"status": "ERROR"}'):
+        self.failures = failures
+        self.status = status
+        self.body = body
+        self.hits = []
+
+    async def aggregates(self, request: web.Request) -> web.Response:
+        self.hits.append(request.path_qs)
+        if len(self.hits) <= self.failures:
+            return web.Response(status=self.status, text=self.body, content_type='application/json')
+
+        start, end = int(request.match_info['start']), int(request.match_info['end'])
+        first = -(-start // MINUTE) * MINUTE
+        times = range(first, end + 1, MINUTE)[:int(request.query['limit'])]
+
+        return web.json_response({
+            'results': [{'t': t, 'o': 1., 'h': 2., 'l': .5, 'c': 1.5, 'v': 10.} for t in times],
+        })
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/v2/aggs/ticker/{symbol}/range/{multiplier}/{unit}/{start}/{end}', self.aggregates)
+        return app
+
+
+@pytest.fixture
+def polygon(monkeypatch):
+    monkeypatch.setattr(PolygonAPI, 'limiter', TokenBucket(capacity=1000, rate=1000))
+    monkeypatch.setattr(PolygonAPI, 'backoff', .01)
+    monkeypatch.setattr(PolygonAPI, 'retries', 3)
+    monkeypatch.setattr(PolygonAPI, 'klines_limit', 100)
+    monkeypatch.setattr(PolygonAPI, 'window', timedelta(hours=12))
+    return monkeypatch
+
+
+def serve(polygon, fake: FakePolygon, coroutine):
+    """
+    Runs `coroutine(PolygonAPI)` with the API pointed at a local server of the fake
+    """
+    async def run():
+        async with TestServer(fake.app()) as server:
+            polygon.setattr(PolygonAPI, 'DOMAIN', str(server.make_url('/')))
+            return await coroutine(PolygonAPI)
+
+    return asyncio.run(run())
+
+
+def expected_times(start: datetime, end: datetime) -> list[datetime]:
+    return [start + timedelta(minutes=minute) for minute in range(int((end - start) / timedelta(minutes=1)))]
+
+
+def test_windows_are_paginated(polygon):
+    start, end = datetime(2024, 1, 1), datetime(2024, 1, 2, 3)
+    fake = FakePolygon()
+
+    klines = serve(polygon, fake, lambda api: api.get_many_klines_async(['AAPL'], 1, 'minute', start, end))['AAPL']
+
+    assert klines['time'].tolist() == expected_times(start, end)
+    # three windows of 720, 720 and 180 candles in pages of 100
+    assert len(fake.hits) == 8 + 8 + 2
+
+
+def test_rate_limited_requests_are_retried(polygon):
+    start, end = datetime(2024, 1, 1), datetime(2024, 1, 1, 1)
+    fake = FakePolygon(failures=2, status=429)
+
+    klines = serve(polygon, fake, lambda api: api.get_many_klines_async(['AAPL'], 1, 'minute', start, end))['AAPL']
+
+    assert klines['time'].tolist() == expected_times(start, end)
+    assert len(fake.hits) == 2 + 1
+
+
+def test_rate_limit_message_is_retried(polygon):
+    start, end = datetime(2024, 1, 1), datetime(2024, 1, 1, 1)
+    fake = FakePolygon(failures=1, status=200, body='{"error": "You\'ve exceeded the maximum requests per minute"}')
+
+    klines = serve(polygon, fake, lambda api: api.get_many_klines_async(['AAPL'], 1, 'minute', start, end))['AAPL']
+
+    assert len(klines) == 60
+    assert len(fake.hits) == 2
+
+
+@pytest.mark.parametrize('status, hits', [(401, 1), (404, 1), (503, 3)])
+def test_failed_requests_raise(polygon, status, hits):
+    start, end = datetime(2024, 1, 1), datetime(2024, 1, 1, 1)
+    fake = FakePolygon(failures=10, status=status, body='{"status": "ERROR", "error": "Unknown API Key"}')
+
+    with pytest.raises(ConnectionError):
+        serve(polygon, fake, lambda api: api.get_many_klines_async(['AAPL'], 1, 'minute', start, end))
+
+    assert len(fake.hits) == hits
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+from pandas import DataFrame, date_range
+
+pytest.importorskip('pandas_ta')
+pytest.importorskip('binance')
+
+from backtest import simulate
+
+
+def random_candles(n: int, seed: int = 0) -> DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, .002, n)))
+    open_ = np.concatenate(([100], close[:-1])) * np.exp(rng.normal(0, .001, n))
+    spread = np.abs(rng.normal(0, .002, n)) * close
+
+    return DataFrame({
+        'time': date_range('2024-01-01', periods=n, freq='1min'),
+        'open': open_,
+        'high': np.maximum(open_, close) + spread,
+        'low': np.minimum(open_, close) - spread,
+        'close': close,
+    })
+
+
+def walk(content: DataFrame, signal: int, is_long: bool, take_profit: float, stop_loss: float, max_bars=None):
+    """
+    Reference simulation of one trade, candle by candle
+    """
+    entry_bar = signal + 1
+    entry = content['open'].iloc[entry_bar]
+    direction = 1 if is_long else -1
+    tp, sl = entry * (1 + direction * take_profit), entry * (1 - direction * stop_loss)
+
+    last_bar = len(content) - 1 if max_bars is None else min(entry_bar + max_bars - 1, len(content) - 1)
+    for bar in range(entry_bar, last_bar + 1):
+        candle = content.iloc[bar]
+        hit_sl = candle['low'] <= sl if is_long else candle['high'] >= sl
+        hit_tp = candle['high'] >= tp if is_long else candle['low'] <= tp
+
+        if hit_sl:
+            price = min(sl, candle['open']) if is_long else max(sl, candle['open'])
+            return bar, price, 'SL'
+        if hit_tp:
+            price = max(tp, candle['open']) if is_long else min(tp, candle['open'])
+            return bar, price, 'TP'
+
+    return last_bar, content['close'].iloc[last_bar], 'URGENTLY'
+
+
+@pytest.mark.parametrize('max_bars', [None, 1, 7, 200])
+def test_simulate_matches_a_bar_by_bar_walk(max_bars):
+    content = random_candles(2000)
+    rng = np.random.default_rng(1)
+    entries = np.sort(rng.choice(len(content), 300, replace=False))
+    is_long = rng.random(300) < .5
+    take_profit, stop_loss = rng.uniform(.001, .02, 300), rng.uniform(.001, .02, 300)
+
+    simulated = simulate(content, entries, is_long, take_profit, stop_loss, fee=.001, max_bars=max_bars, block_size=4)
+
+    expected = [
+        walk(content, signal, long, tp, sl, max_bars)
+        for signal, long, tp, sl in zip(entries, is_long, take_profit, stop_loss)
+        if signal + 1 < len(content)
+    ]
+    assert len(simulated) == len(expected)
+
+    np.testing.assert_array_equal(simulated['exit_bar'], [bar for bar, _, _ in expected])
+    np.testing.assert_allclose(simulated['exit_price'], [price for _, price, _ in expected])
+    assert simulated['closed_by'].astype(str).tolist() == [by for _, _, by in expected]
+
+    direction = np.where(simulated['side'] == 'LONG', 1, -1)
+    fees = .001 * (simulated['entry_price'] + simulated['exit_price'])
+    np.testing.assert_allclose(
+        simulated['profit_or_loss'], direction * (simulated['exit_price'] - simulated['entry_price']) - fees)
+
+
+def test_simulate_rejects_max_bars_below_one():
+    with pytest.raises(ValueError):
+        simulate(random_candles(10), np.array([1]), np.array([True]), .01, .01, max_bars=0)
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('pandas_ta')
+pytest.importorskip('binance')
+
+from backtest import FeatureMatrix, sweep_thresholds
+from backtest.sweep import _side_curve
+
+
+def random_matrix(n: int = 400, seed: int = 0) -> FeatureMatrix:
+    rng = np.random.default_rng(seed)
+    features = np.column_stack([
+        rng.normal(0, 1, n),
+        rng.integers(0, 10, n).astype(float),  # repeated values
+        np.where(rng.random(n) < .2, np.nan, rng.uniform(0, 100, n)),  # missing values
+    ])
+    return FeatureMatrix(features, ['a', 'b', 'c'], rng.normal(0, 1, n), rng.random(n) < .5, np.arange(n))
+
+
+def brute_force(values: np.ndarray, pnl: np.ndarray, operator: str, threshold: float) -> tuple[int, int, float]:
+    passed = values < threshold if operator == '<' else values > threshold
+    return int(passed.sum()), int((pnl[passed] > 0).sum()), float(pnl[passed].sum())
+
+
+def test_side_curve_matches_brute_force():
+    matrix = random_matrix()
+
+    for column in matrix.columns:
+        values = matrix.features[:, matrix.column_index[column]]
+
+        for side_mask in (matrix.is_long, ~matrix.is_long):
+            curve = _side_curve(values[side_mask], matrix.pnl[side_mask])
+            assert len(curve) == 2 * len(np.unique(values[side_mask & ~np.isnan(values)]))
+
+            for row in curve.itertuples():
+                trades, wins, pnl = brute_force(values[side_mask], matrix.pnl[side_mask], row.operator, row.threshold)
+                assert (row.trades, row.wins) == (trades, wins)
+                assert row.pnl == pytest.approx(pnl, abs=1e-9)
+
+
+@pytest.mark.parametrize('min_trades', [1, 50, 10_000])
+def test_sweep_thresholds_picks_the_best_eligible_threshold(min_trades):
+    matrix = random_matrix()
+    best, curves = sweep_thresholds(matrix, min_trades=min_trades)
+
+    for column, curve in curves.items():
+        eligible = curve[curve['trades'] >= min_trades]
+        found = best[best['column'] == column]
+
+        if eligible.empty:
+            assert found.empty
+        else:
+            assert found['pnl'].iloc[0] == pytest.approx(eligible['pnl'].max())
+            assert found['trades'].iloc[0] >= min_trades
+
+    assert best['pnl'].is_monotonic_decreasing
@@ -0,0 +1,49 @@
+from datetime import timedelta
+
+import numpy as np
+import pytest
+from pandas import DataFrame, Index, date_range, to_datetime
+
+pytest.importorskip('pandas_ta')
+pytest.importorskip('binance')
+
+import tester
+
+
+def make_trades(opened_at) -> DataFrame:
+    return tester.as_trades([
+        {'opened_at': f'{time:%Y-%m-%d %H:%M:%S}', 'closed_at': f'{time:%Y-%m-%d %H:%M:%S}',
+         'side': 'LONG', 'profit_or_loss': '1'}
+        for time in opened_at
+    ])
+
+
+def exact_lookup(trades: DataFrame, content: DataFrame) -> np.ndarray:
+    """
+    Matching of the baseline tester: the 1m candle opened exactly one minute before the trade
+    """
+    positions = Index(content['time']).get_indexer(Index(trades['opened_at']) - timedelta(minutes=1))
+    return np.where(positions >= 0, positions, -1)
+
+
+def test_match_candles_keeps_exact_minute_matching_on_1m():
+    rng = np.random.default_rng(0)
+    times = date_range('2024-01-01', periods=500, freq='1min')
+    content = DataFrame({'time': times.delete(rng.choice(500, 50, replace=False))})
+
+    opened_at = times[0] + rng.integers(-5 * 60, 510 * 60, 2000) * timedelta(seconds=1)
+    trades = make_trades(opened_at)
+
+    np.testing.assert_array_equal(tester.match_candles(trades, content), exact_lookup(trades, content))
+
+
+@pytest.mark.parametrize('candle, opened_at, expected', [
+    (timedelta(minutes=5), ['00:06', '00:07', '00:10', '00:04', '00:59', '02:00'], [0, 0, 1, -1, 10, -1]),
+    (timedelta(hours=1), ['01:00', '01:59', '03:30', '00:30'], [0, 0, 2, -1]),
+])
+def test_match_candles_uses_the_last_closed_candle(candle, opened_at, expected):
+    periods = 12 if candle < timedelta(hours=1) else 3
+    content = DataFrame({'time': date_range('2024-01-01', periods=periods, freq=candle)})
+    trades = make_trades(to_datetime([f'2024-01-01 {time}' for time in opened_at]))
+
+    assert tester.match_candles(trades, content, candle).tolist() == expected
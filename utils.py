@@ -1,8 +1,11 @@
 from enum import Enum
 import dataclasses
 from datetime import datetime, timedelta
+from multiprocessing.shared_memory import SharedMemory
 from typing import Literal
 
+from numpy import ndarray, ascontiguousarray, dtype
+
 
 class TradeStatus(str, Enum):
     NEW = 'NEW'
@@ -47,6 +50,10 @@ class TimeFrame:
 
         self.minutes = self.__graduation__.get(unit) * value
 
+    @property
+    def timedelta(self) -> timedelta:
+        return timedelta(minutes=self.minutes)
+
     def __str__(self):
         return f'{self.value}{self.unit}'
 
@@ -155,6 +162,51 @@ class Trade:
         return {k: self.__dict__.get(k) for k in cols}
 
 
+def merge_intervals(intervals) -> list[tuple]:
+    """
+    Merges overlapping and touching `[start, end)` intervals
+
+    :param intervals: iterable of `(start, end)` pairs
+    :return: sorted, disjoint intervals
+    """
+    merged = []
+
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+
+    return merged
+
+
+def missing_intervals(start, end, covered) -> list[tuple]:
+    """
+    Finds the parts of `[start, end)` which are not covered by any of the intervals
+
+    :param start: start of the requested range
+    :param end: end of the requested range
+    :param covered: iterable of covered `(start, end)` intervals
+    :return: sorted, disjoint missing intervals
+    """
+    missing = []
+
+    for covered_start, covered_end in merge_intervals(covered):
+        if covered_end <= start:
+            continue
+        if covered_start >= end:
+            break
+
+        if covered_start > start:
+            missing.append((start, covered_start))
+        start = max(start, covered_end)
+
+    if start < end:
+        missing.append((start, end))
+
+    return missing
+
+
 def get_batch(iterable, batch_size: int, agg_func):
     result = []
 
@@ -167,3 +219,51 @@ def get_batch(iterable, batch_size: int, agg_func):
         result = list(map(agg_func, result))
 
     return result
+
+
+class SharedArrays:
+    """
+    Numpy arrays placed in shared memory, so worker processes can read them without pickling.
+
+    The creating process owns the blocks and unlinks them on `close`, workers `attach` by `spec`.
+    """
+
+    def __init__(self, blocks: dict[str, SharedMemory], spec: dict[str, tuple[str, tuple, str]], owner: bool):
+        self.blocks = blocks
+        self.spec = spec
+        self.owner = owner
+
+    @classmethod
+    def create(cls, **arrays: ndarray):
+        blocks, spec = {}, {}
+
+        for name, array in arrays.items():
+            array = ascontiguousarray(array)
+            shm = SharedMemory(create=True, size=max(array.nbytes, 1))
+            ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+
+            blocks[name] = shm
+            spec[name] = (shm.name, array.shape, array.dtype.str)
+
+        return cls(blocks, spec, owner=True)
+
+    @classmethod
+    def attach(cls, spec: dict[str, tuple[str, tuple, str]]):
+        blocks = {name: SharedMemory(name=shm_name) for name, (shm_name, _, _) in spec.items()}
+        return cls(blocks, spec, owner=False)
+
+    def __getitem__(self, name: str) -> ndarray:
+        _, shape, dtype_str = self.spec[name]
+        return ndarray(shape, dtype=dtype(dtype_str), buffer=self.blocks[name].buf)
+
+    def close(self):
+        for shm in self.blocks.values():
+            shm.close()
+            if self.owner:
+                shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()